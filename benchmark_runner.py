@@ -0,0 +1,94 @@
+"""Runner shared by the throughput benchmarks of the repository.
+
+Each package has a `benchmark.py` defining its cases, functions returning the
+result of `measure`, and calling `run_benchmarks`, which runs them, prints
+records/sec and latency percentiles and compares them with the baseline
+stored next to the benchmark.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def measure(func: Callable[[], Any], records_per_call: int, iterations: int, warmup: int = 1,
+            check: Optional[Callable[[Any], None]] = None) -> dict:
+    """Time `func` over several iterations and return throughput and latency percentiles.
+
+    `check` is called with the output of every warmup call and should raise
+    when the case did not do its work (e.g. records failed instead of being
+    scored), so that a broken case is not timed as a fast one.
+    """
+    for _ in range(max(warmup, 1 if check else 0)):
+        output = func()
+        if check is not None:
+            check(output)
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {
+        "iterations": iterations,
+        "records_per_second": records_per_call * iterations / sum(timings),
+        "p50": statistics.median(timings),
+        "p95": percentile(timings, 0.95),
+        "p99": percentile(timings, 0.99),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Return the names of the cases whose median latency regressed beyond the tolerance."""
+    regressions = []
+    for name, result in results.items():
+        if name in baseline and result["p50"] > baseline[name]["p50"] * (1 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def run_benchmarks(benchmarks: Dict[str, Callable[[], dict]], description: str, baseline_path: str):
+    """Command line entry point of a benchmark module."""
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", help="Run only the cases whose name contains this string")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the baseline")
+    parser.add_argument("--baseline", default=baseline_path, help="Baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative increase of the median latency (default: 0.25)")
+    args = parser.parse_args()
+
+    results = {}
+    for name, bench in benchmarks.items():
+        if args.only and args.only not in name:
+            continue
+        results[name] = bench()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+
+    print(f"{'benchmark':<28} {'records/s':>12} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'baseline p50':>13}")
+    for name, result in results.items():
+        reference = f"{baseline[name]['p50'] * 1000:.2f}" if name in baseline else "-"
+        flag = "  REGRESSION" if name in regressions else ""
+        print(
+            f"{name:<28} {result['records_per_second']:>12.1f} {result['p50'] * 1000:>10.2f} "
+            f"{result['p95'] * 1000:>10.2f} {result['p99'] * 1000:>10.2f} {reference:>13}{flag}"
+        )
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({**baseline, **results}, f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved to {args.baseline}")
+    elif regressions:
+        sys.exit(1)
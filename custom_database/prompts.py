@@ -344,6 +344,18 @@ Sample paths:
 {paths}
 """
 
+# user_prompt split into the per-database schema and the per-request paths,
+# so that the schema can be marked as a cacheable prefix
+user_schema_prompt = """
+Graph schema:
+{schema}
+"""
+
+user_paths_prompt = """
+Sample paths:
+{paths}
+"""
+
 qa_system_prompt = """You are a helpful assistant that answers questions using data from a Neo4j database.
 Given a natural language question, the Cypher query used to answer it, and the query result, return a 
 concise and accurate answer based only on the result. If the Cypher query cannot provide sufficient information 
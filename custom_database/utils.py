@@ -1,9 +1,16 @@
 import asyncio
+import hashlib
 import json
+import os
+import random
+import shutil
+import sqlite3
+import time
 
 import json_repair
 import re
 from datetime import datetime
+from pathlib import Path
 
 import pandas as pd
 import neo4j
@@ -11,14 +18,17 @@ import neo4j
 from tqdm.asyncio import tqdm_asyncio
 from tqdm import tqdm
 from langchain_anthropic import ChatAnthropic
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langchain_neo4j import Neo4jGraph
 from CyVer import SchemaValidator
 
-from typing import Any
+from typing import Any, Optional
 
 from prompts import (
     system_prompt,
     user_prompt,
+    user_schema_prompt,
+    user_paths_prompt,
     qa_system_prompt,
     qa_user_prompt
 )
@@ -28,7 +38,187 @@ def convert_datetime(obj):
         return obj.isoformat()
     raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
 
-def _value_sanitize(d):
+def _model_name(model: Any) -> str:
+    """Return the most specific identifier available for a chat model."""
+    return getattr(model, "model", None) or getattr(model, "model_name", None) or model._llm_type
+
+def generation_unit(model: Any, db_url: str, database_name: str, system_prompt: str, iteration: int) -> dict:
+    """Describe one (model, server, database, prompt, iteration) unit of dataset generation.
+
+    Databases are identified by server URL and name, since servers commonly
+    share database names such as "neo4j". The prompt is identified by a short
+    hash so that the simple and multi-hop prompts (or any edited version of
+    them) are tracked separately.
+    """
+    return {
+        "model": _model_name(model),
+        "uri": db_url,
+        "database": database_name,
+        "prompt": hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:12],
+        "iteration": iteration,
+    }
+
+def _unit_key(unit: dict) -> tuple:
+    return (unit["model"], unit.get("uri"), unit["database"], unit["prompt"], unit["iteration"])
+
+def _read_jsonl(path: str) -> list:
+    """Read a JSONL file, ignoring a truncated trailing line left by a crash."""
+    entries = []
+    if not os.path.exists(path):
+        return entries
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return entries
+
+def _ends_with_newline(path: str) -> bool:
+    """Whether a file is missing, empty or ends with a complete line."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return True
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+def read_jsonl_records(path: str) -> list:
+    """Return the records of all completed generation units stored in a JSONL file.
+
+    The `unit` bookkeeping field is removed, so the records are ready for the dataset.
+    """
+    entries = _read_jsonl(path)
+    completed = {_unit_key(e["_checkpoint"]) for e in entries if "_checkpoint" in e}
+    return [
+        {key: value for key, value in e.items() if key != "unit"}
+        for e in entries
+        if "_checkpoint" not in e and "unit" in e and _unit_key(e["unit"]) in completed
+    ]
+
+class JsonlWriter:
+    """Stream generated records to a JSONL file as soon as they are produced.
+
+    Each record is written as one line (datetimes converted with
+    `convert_datetime`) and flushed immediately. Once every record of a
+    generation unit has been written, a `{"_checkpoint": unit}` line marks the
+    unit as complete.
+
+    With `resume=True` the existing file is compacted first: records of units
+    that never reached their checkpoint and a truncated trailing line left by a
+    crash are dropped, and completed units are reported by `is_complete` so
+    that `process_database` can skip them.
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.completed = set()
+        if resume:
+            self._compact()
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def _compact(self):
+        entries = _read_jsonl(self.path)
+        self.completed = {_unit_key(e["_checkpoint"]) for e in entries if "_checkpoint" in e}
+        kept = [
+            e for e in entries
+            if "_checkpoint" in e or ("unit" in e and _unit_key(e["unit"]) in self.completed)
+        ]
+        # A line cut short by a crash has no newline, appending to it would
+        # corrupt the next record
+        if len(kept) == len(entries) and _ends_with_newline(self.path):
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in kept:
+                f.write(json.dumps(entry, default=convert_datetime) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def is_complete(self, unit: dict) -> bool:
+        return _unit_key(unit) in self.completed
+
+    def write_record(self, record: dict):
+        self._file.write(json.dumps(record, default=convert_datetime) + "\n")
+        self._file.flush()
+
+    def mark_complete(self, unit: dict):
+        self._file.write(json.dumps({"_checkpoint": unit}) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.completed.add(_unit_key(unit))
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+# Lists with this many elements or more are dropped from sanitized values
+MAX_LIST_LENGTH = 56
+# Lists of at least this many floats are treated as embeddings and dropped
+EMBEDDING_MIN_DIMENSIONS = 16
+# Character budget for the sampled paths included in the generation prompt
+PATHS_CHAR_BUDGET = 60000
+
+def _is_dropped_list(value: list) -> bool:
+    """Return True for oversized or embedding-like lists."""
+    if len(value) >= MAX_LIST_LENGTH:
+        return True
+    return len(value) >= EMBEDDING_MIN_DIMENSIONS and all(
+        isinstance(item, float) for item in value
+    )
+
+def _sanitize_with_size(d):
+    """Sanitize a value in a single iterative pass.
+
+    Returns the sanitized value and its approximate size in characters when
+    rendered in a prompt. Whether a list is dropped only depends on the list
+    itself, so containers are created top-down and filled from an explicit
+    stack instead of recursing.
+    """
+    if isinstance(d, list):
+        if _is_dropped_list(d):
+            return None, 0
+        root = []
+    elif isinstance(d, dict):
+        root = {}
+    else:
+        return d, len(str(d))
+
+    size = 2
+    stack = [(d, root)]
+    while stack:
+        source, target = stack.pop()
+        items = source.items() if isinstance(source, dict) else enumerate(source)
+        for key, value in items:
+            if isinstance(value, dict):
+                child = {}
+                stack.append((value, child))
+            elif isinstance(value, list):
+                # Do not include oversized or embedding-like lists
+                if _is_dropped_list(value):
+                    continue
+                child = []
+                stack.append((value, child))
+            elif value is None and isinstance(source, list):
+                continue
+            else:
+                child = value
+                size += len(str(value))
+            if isinstance(target, dict):
+                target[key] = child
+                size += len(str(key)) + 6
+            else:
+                target.append(child)
+                size += 4
+    return root, size
+
+def _value_sanitize(d, max_chars: Optional[int] = None):
     """Sanitize the input dictionary or list.
 
     Sanitizes the input by removing embedding-like values,
@@ -37,41 +227,31 @@ def _value_sanitize(d):
     results, can occupy significant context space and detract from
     the LLM's performance by introducing unnecessary noise and cost.
 
+    With `max_chars`, the input must be a list of samples (e.g. query rows):
+    samples are kept in order while their combined size stays within the
+    budget, and the remaining ones are dropped.
+
     Args:
         d (Any): The input dictionary or list to sanitize.
+        max_chars (int, optional): Overall character budget for a list of samples.
 
     Returns:
         Any: The sanitized dictionary or list.
     """
-    if isinstance(d, dict):
-        new_dict = {}
-        for key, value in d.items():
-            if isinstance(value, dict):
-                sanitized_value = _value_sanitize(value)
-                if (
-                    sanitized_value is not None
-                ):  # Check if the sanitized value is not None
-                    new_dict[key] = sanitized_value
-            elif isinstance(value, list):
-                if len(value) < 56:
-                    sanitized_value = _value_sanitize(value)
-                    if (
-                        sanitized_value is not None
-                    ):  # Check if the sanitized value is not None
-                        new_dict[key] = sanitized_value
-                # Do not include the key if the list is oversized
-            else:
-                new_dict[key] = value
-        return new_dict
-    elif isinstance(d, list):
-        if len(d) < 56:
-            return [
-                _value_sanitize(item) for item in d if _value_sanitize(item) is not None
-            ]
-        else:
-            return None
-    else:
-        return d
+    if max_chars is None or not isinstance(d, list):
+        return _sanitize_with_size(d)[0]
+
+    sanitized = []
+    total = 0
+    for item in d:
+        value, size = _sanitize_with_size(item)
+        if value is None:
+            continue
+        if total + size > max_chars:
+            break
+        sanitized.append(value)
+        total += size
+    return sanitized
     
 def extract_json_from_markdown(text: str):
     """
@@ -98,26 +278,39 @@ def extract_json_from_markdown(text: str):
             print("JSON decode error:", e)
     return None
 
-sampling_query = """// Collect sample nodes with different labels for diversity
-MATCH (n)
-WITH labels(n) as labelSet, collect(n)[0] as sampleNode
-ORDER BY size(labelSet) DESC, rand()
-WITH collect(sampleNode) as sampleNodes
-
-// Generate paths from diverse starting points
-UNWIND sampleNodes[0..15] as startNode
-CALL (startNode) {
-    // Get shorter paths
-    MATCH p1=(startNode)-[*2..3]-()
-    RETURN p1 as p
-    LIMIT 2
-    UNION ALL
-    // Get longer paths
-    WITH startNode  
-    MATCH p2=()-[*3..4]->(startNode)
-    RETURN p2 as p
-    LIMIT 2
+# Label counts are read from the count store, without scanning nodes
+label_counts_query = """CALL apoc.meta.stats() YIELD labels
+RETURN labels"""
+
+# Default options for `sample_paths`
+DEFAULT_SAMPLING = {
+    "max_labels": 15,        # Labels used as strata for start nodes
+    "nodes_per_label": 1,    # Start nodes picked per label
+    "paths_per_node": 4,     # Paths kept per start node
+    "min_hops": 2,
+    "max_hops": 4,
+    "max_fanout": 100,       # Paths expanded per start node before random selection
+    "max_skip": 10000,       # Upper bound on the random offset into a label scan
+    "limit": 25,             # Paths returned
 }
+
+def _start_nodes_query(label: str) -> str:
+    label = label.replace("`", "``")
+    return f"""MATCH (n:`{label}`)
+WITH n SKIP $skip LIMIT $limit
+RETURN elementId(n) AS id"""
+
+def path_sampling_query(min_hops: int, max_hops: int) -> str:
+    """Build the query expanding bounded paths from the given start nodes."""
+    return f"""UNWIND $start_ids AS start_id
+MATCH (startNode) WHERE elementId(startNode) = start_id
+CALL (startNode) {{
+    // Stop expanding after max_fanout paths, then pick randomly among them
+    MATCH p=(startNode)-[*{int(min_hops)}..{int(max_hops)}]-()
+    WITH p LIMIT $max_fanout
+    WITH p ORDER BY rand() LIMIT $paths_per_node
+    RETURN p
+}}
 // Deduplicate and enrich path information
 WITH DISTINCT p
 WITH p,
@@ -127,8 +320,8 @@ WITH p,
 
 RETURN 
     pathLength,
-    [node in pathNodes | {labels: labels(node), props: properties(node)}] as nodesInfo,
-    [rel in pathRels | {type: type(rel), props: properties(rel)}] as relsInfo,
+    [node in pathNodes | {{labels: labels(node), props: properties(node)}}] as nodesInfo,
+    [rel in pathRels | {{type: type(rel), props: properties(rel)}}] as relsInfo,
     // Create a human-readable path signature
     reduce(s = "", i in range(0, length(p) + 1) | 
         s + 
@@ -139,7 +332,200 @@ RETURN
         END
     ) + "(:" + labels(nodes(p)[-1])[0] + ")" as pathSignature
 ORDER BY pathLength DESC, rand()
-LIMIT 25"""
+LIMIT $limit"""
+
+def _sampling_plan(label_counts: dict, options: dict) -> list:
+    """Pick the labels to sample from and a random offset into each label."""
+    labels = [label for label, count in label_counts.items() if count > 0]
+    if len(labels) > options["max_labels"]:
+        labels = random.sample(labels, options["max_labels"])
+    plan = []
+    for label in labels:
+        max_offset = min(label_counts[label] - options["nodes_per_label"], options["max_skip"])
+        params = {"skip": random.randint(0, max(max_offset, 0)), "limit": options["nodes_per_label"]}
+        plan.append((_start_nodes_query(label), params))
+    return plan
+
+def _path_params(start_ids: list, options: dict) -> dict:
+    return {
+        "start_ids": start_ids,
+        "max_fanout": options["max_fanout"],
+        "paths_per_node": options["paths_per_node"],
+        "limit": options["limit"],
+    }
+
+def sample_paths(graph: Neo4jGraph, sampling: Optional[dict] = None) -> list:
+    """Sample diverse paths with a cost independent of the graph size.
+
+    Start nodes are stratified by label: label counts come from the count
+    store and each label is entered at a random (bounded) offset instead of
+    collecting every node. Expansion from each start node stops after
+    `max_fanout` paths.
+
+    Args:
+        graph: Graph connection
+        sampling: Options overriding `DEFAULT_SAMPLING`
+
+    Returns:
+        Paths with their length, nodes, relationships and signature.
+    """
+    options = {**DEFAULT_SAMPLING, **(sampling or {})}
+    label_counts = graph.query(label_counts_query)[0]["labels"]
+    start_ids = []
+    for query, params in _sampling_plan(label_counts, options):
+        start_ids.extend(row["id"] for row in graph.query(query, params))
+    return graph.query(
+        path_sampling_query(options["min_hops"], options["max_hops"]),
+        _path_params(start_ids, options),
+    )
+
+async def asample_paths(connection: "AsyncGraphConnection", sampling: Optional[dict] = None) -> list:
+    """Asynchronous counterpart of `sample_paths`."""
+    options = {**DEFAULT_SAMPLING, **(sampling or {})}
+    label_counts = (await connection.query(label_counts_query))[0]["labels"]
+    plan = _sampling_plan(label_counts, options)
+    rows = await asyncio.gather(*(connection.query(query, params) for query, params in plan))
+    start_ids = [row["id"] for label_rows in rows for row in label_rows]
+    return await connection.query(
+        path_sampling_query(options["min_hops"], options["max_hops"]),
+        _path_params(start_ids, options),
+    )
+
+def build_path_pool(graph: Neo4jGraph, sampling: Optional[dict] = None, rounds: int = 8) -> list:
+    """Run `sample_paths` several times and return the distinct paths found."""
+    pool = {}
+    for _ in range(rounds):
+        for row in sample_paths(graph, sampling):
+            pool.setdefault(json.dumps(row, sort_keys=True, default=convert_datetime), row)
+    return list(pool.values())
+
+async def abuild_path_pool(connection: "AsyncGraphConnection", sampling: Optional[dict] = None,
+                           rounds: int = 8) -> list:
+    """Asynchronous counterpart of `build_path_pool`."""
+    pool = {}
+    for rows in await asyncio.gather(*(asample_paths(connection, sampling) for _ in range(rounds))):
+        for row in rows:
+            pool.setdefault(json.dumps(row, sort_keys=True, default=convert_datetime), row)
+    return list(pool.values())
+
+def draw_paths(pool: list, sampling: Optional[dict] = None, seed: Optional[str] = None) -> list:
+    """Draw a random sample of paths from a pool, longest paths first.
+
+    With a seed, the same pool always yields the same paths, which keeps the
+    generation prompt (and therefore its cached LLM response) stable across runs.
+    """
+    limit = {**DEFAULT_SAMPLING, **(sampling or {})}["limit"]
+    rng = random.Random(seed) if seed is not None else random
+    paths = rng.sample(pool, min(limit, len(pool)))
+    return sorted(paths, key=lambda path: path.get("pathLength", 0), reverse=True)
+
+# Cheap summary of the database used to detect schema or data changes
+fingerprint_query = """CALL apoc.meta.stats()
+YIELD labels, relTypesCount, propertyKeyCount, nodeCount, relCount
+RETURN labels, relTypesCount, propertyKeyCount, nodeCount, relCount"""
+
+class DatabaseCache:
+    """Cached schema snapshot and path pool of a single database.
+
+    Entries are only returned while they match the current schema
+    fingerprint and are younger than `ttl` seconds.
+    """
+
+    def __init__(self, directory: str, fingerprint: str, ttl: Optional[float], pool_rounds: int):
+        self.directory = directory
+        self.fingerprint = fingerprint
+        self.ttl = ttl
+        self.pool_rounds = pool_rounds
+
+    def _path(self, kind: str) -> str:
+        return os.path.join(self.directory, f"{kind}.json")
+
+    def load(self, kind: str) -> Any:
+        try:
+            with open(self._path(kind), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if entry.get("fingerprint") != self.fingerprint:
+            return None
+        if self.ttl is not None and time.time() - entry.get("created_at", 0) > self.ttl:
+            return None
+        return entry["value"]
+
+    def store(self, kind: str, value: Any) -> Any:
+        """Store a value and return it as it will be loaded back (JSON round trip)."""
+        entry = {"fingerprint": self.fingerprint, "created_at": time.time(), "value": value}
+        serialized = json.dumps(entry, default=convert_datetime)
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self._path(kind)}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(serialized)
+        os.replace(tmp_path, self._path(kind))
+        return json.loads(serialized)["value"]
+
+    def invalidate(self, kind: Optional[str] = None):
+        kinds = [kind] if kind else ["schema", "paths"]
+        for name in kinds:
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+
+class GraphCache:
+    """On-disk cache of schema snapshots and sampled path pools.
+
+    Entries are stored per database (keyed by URI and database name) and tied
+    to a fingerprint of the database, so repeated iterations against an
+    unchanged database skip schema introspection and draw their paths from a
+    precomputed pool instead of sampling the server again.
+
+    Args:
+        cache_dir: Directory holding the cache
+        ttl: Maximum age of an entry in seconds (None to never expire)
+        pool_rounds: Number of `sample_paths` runs used to build a path pool
+    """
+
+    def __init__(self, cache_dir: str = ".graph_cache", ttl: Optional[float] = 7 * 24 * 3600,
+                 pool_rounds: int = 8):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.pool_rounds = pool_rounds
+
+    def _directory(self, db_url: str, database_name: str) -> str:
+        key = hashlib.sha256(f"{db_url}|{database_name}".encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{database_name}-{key}")
+
+    def for_database(self, db_url: str, database_name: str, fingerprint: str) -> DatabaseCache:
+        return DatabaseCache(
+            self._directory(db_url, database_name), fingerprint, self.ttl, self.pool_rounds
+        )
+
+    def invalidate(self, db_url: Optional[str] = None, database_name: Optional[str] = None):
+        """Remove the entries of one database, or the whole cache if none is given."""
+        if db_url is None or database_name is None:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+        else:
+            shutil.rmtree(self._directory(db_url, database_name), ignore_errors=True)
+
+def schema_fingerprint(rows: list) -> str:
+    return hashlib.sha256(
+        json.dumps(rows, sort_keys=True, default=convert_datetime).encode("utf-8")
+    ).hexdigest()
+
+def cached_schema(graph: Neo4jGraph, cache: GraphCache, db_url: str, database_name: str) -> DatabaseCache:
+    """Set the graph schema from the cache, introspecting and storing it on a miss.
+
+    Returns the cache entries of the database, used to look up its path pool.
+    """
+    fingerprint = schema_fingerprint(graph.query(fingerprint_query))
+    database_cache = cache.for_database(db_url, database_name, fingerprint)
+    snapshot = database_cache.load("schema")
+    if snapshot is None:
+        graph.refresh_schema()
+        snapshot = database_cache.store(
+            "schema", {"schema": graph.schema, "structured_schema": graph.structured_schema}
+        )
+    graph.schema = snapshot["schema"]
+    graph.structured_schema = snapshot["structured_schema"]
+    return database_cache
 
 def validate_cypher(schema_validator, query, database_name):
     schema_score, schema_metadata = schema_validator.validate(query, database_name=database_name)
@@ -148,41 +534,812 @@ def validate_cypher(schema_validator, query, database_name):
     else:
         return False
 
+# Default settings of the EXPLAIN cost guard applied before executing generated Cypher
+DEFAULT_COST_GUARD = {
+    "max_estimated_rows": 1000000,              # Largest planner row estimate of any operator
+    "forbidden_operators": ["CartesianProduct"],
+    "allow_unbounded_expand": False,            # Variable-length patterns without upper bound
+    "reject": True,                             # False only flags costly queries
+    "profile": False,                           # PROFILE accepted queries to record db hits
+}
+
+def _is_unbounded_pattern(details: str) -> bool:
+    """Return True if a plan description contains a variable-length pattern without upper bound."""
+    for lower, has_range, upper in re.findall(r"\*(\d*)(\.\.)?(\d*)", details):
+        if (has_range and not upper) or (not has_range and not lower):
+            return True
+    return False
+
+def summarize_plan(plan: dict) -> dict:
+    """Summarize an EXPLAIN or PROFILE plan returned by the driver.
+
+    Returns the operators used, the largest estimated row count, whether an
+    unbounded variable-length expand is present and, for profiled plans, the
+    total number of db hits.
+    """
+    operators = set()
+    estimated_rows = 0.0
+    db_hits = None
+    unbounded_expand = False
+    stack = [plan]
+    while stack:
+        operator = stack.pop()
+        name = operator.get("operatorType", "").split("@")[0]
+        args = operator.get("args", {})
+        operators.add(name)
+        estimated_rows = max(estimated_rows, float(args.get("EstimatedRows", 0)))
+        if "dbHits" in operator:
+            db_hits = (db_hits or 0) + operator["dbHits"]
+        if name.startswith("VarLengthExpand") and _is_unbounded_pattern(str(args.get("Details", ""))):
+            unbounded_expand = True
+        stack.extend(operator.get("children", []))
+    summary = {
+        "operators": sorted(operators),
+        "estimated_rows": estimated_rows,
+        "unbounded_expand": unbounded_expand,
+    }
+    if db_hits is not None:
+        summary["db_hits"] = db_hits
+    return summary
+
+def check_query_cost(plan_summary: dict, cost_guard: dict) -> list:
+    """Return the reasons why a plan exceeds the cost guard (empty if it does not)."""
+    reasons = []
+    if plan_summary["estimated_rows"] > cost_guard["max_estimated_rows"]:
+        reasons.append(
+            f"estimated rows {plan_summary['estimated_rows']:.0f} above {cost_guard['max_estimated_rows']}"
+        )
+    for forbidden in cost_guard["forbidden_operators"]:
+        if any(operator.startswith(forbidden) for operator in plan_summary["operators"]):
+            reasons.append(f"{forbidden} in plan")
+    if plan_summary["unbounded_expand"] and not cost_guard["allow_unbounded_expand"]:
+        reasons.append("unbounded variable-length expand")
+    return reasons
+
+def _guard_accepts(record: dict, plan_summary: dict, cost_guard: dict) -> bool:
+    """Store the plan and cost flags in the record and tell whether to execute it."""
+    record["plan"] = plan_summary
+    record["cost_flags"] = check_query_cost(plan_summary, cost_guard)
+    if record["cost_flags"] and cost_guard["reject"]:
+        record["validated"] = False
+        return False
+    return True
+
+def _run_with_summary(graph: Neo4jGraph, database_name: str, query: str) -> tuple:
+    """Run a read query on the graph driver and return its rows and result summary."""
+    records, summary, _ = graph._driver.execute_query(
+        neo4j.Query(query, timeout=getattr(graph, "timeout", None)),
+        database_=database_name,
+        routing_=neo4j.RoutingControl.READ,
+    )
+    return [record.data() for record in records], summary
 
-def create_graph_connection(database_name: str, username: str, password: str, db_url: str) -> Neo4jGraph:
-    """Create and return a Neo4j graph connection."""
+
+def create_graph_connection(database_name: str, username: str, password: str, db_url: str,
+                            refresh_schema: bool = True,
+                            snapshot: Optional["GraphSnapshot"] = None) -> Neo4jGraph:
+    """Create and return a Neo4j graph connection (a `FakeNeo4jGraph` given a snapshot)."""
+    if snapshot is not None:
+        return FakeNeo4jGraph(snapshot, database_name)
     return Neo4jGraph(
         url=db_url,
         username=username,
         password=password,
         database=database_name,
-        timeout=90
+        timeout=90,
+        refresh_schema=refresh_schema
     )
 
 
-def generate_qa_pairs(graph: Neo4jGraph, model: ChatAnthropic, system_prompt: str) -> list:
-    """Generate question-answer pairs using the LLM and graph data."""
-    paths = _value_sanitize(graph.query(sampling_query))
-    messages = [
-        ("system", system_prompt),
-        ("human", user_prompt.format(schema=graph.schema, paths=paths)),
+class AsyncGraphConnection:
+    """Graph connection used by the asynchronous generation pipeline.
+
+    Schema introspection and CyVer validation only work with the synchronous
+    `Neo4jGraph` driver, so they are kept on `graph`; every query is sent
+    through a separate async driver instead of blocking the event loop.
+    """
+
+    def __init__(self, graph: Neo4jGraph, driver: neo4j.AsyncDriver, database_name: str,
+                 cache: Optional[DatabaseCache] = None):
+        self.graph = graph
+        self.driver = driver
+        self.database_name = database_name
+        self.schema_validator = _schema_validator(graph)
+        self.cache = cache
+        self._pool_lock = asyncio.Lock()
+
+    @property
+    def schema(self) -> str:
+        return self.graph.schema
+
+    async def query(self, query: str, params: Optional[dict] = None,
+                    timeout: Optional[float] = None) -> list:
+        """Run a read query, optionally bounded by a transaction timeout in seconds.
+
+        The timeout is enforced by the server and, should the server not honour
+        it, by cancelling the query on the client.
+        """
+        rows, _ = await self.run(query, params, timeout)
+        return rows
+
+    async def run(self, query: str, params: Optional[dict] = None,
+                  timeout: Optional[float] = None) -> tuple:
+        """Like `query`, but return the result summary along with the rows."""
+        coroutine = self.driver.execute_query(
+            neo4j.Query(query, timeout=timeout),
+            params or {},
+            database_=self.database_name,
+            routing_=neo4j.RoutingControl.READ,
+        )
+        records, summary, _ = await asyncio.wait_for(coroutine, timeout)
+        return [record.data() for record in records], summary
+
+    async def path_pool(self, sampling: Optional[dict] = None) -> list:
+        """Return the cached path pool, building and storing it on a miss."""
+        async with self._pool_lock:
+            pool = self.cache.load("paths")
+            if pool is None:
+                pool = self.cache.store(
+                    "paths", await abuild_path_pool(self, sampling, self.cache.pool_rounds)
+                )
+            return pool
+
+    async def close(self):
+        await self.driver.close()
+        await asyncio.to_thread(self.graph.close)
+
+
+async def acreate_graph_connection(database_name: str, username: str, password: str, db_url: str,
+                                   cache: Optional[GraphCache] = None,
+                                   snapshot: Optional["GraphSnapshot"] = None) -> AsyncGraphConnection:
+    """Create a graph connection backed by an async driver (or by a snapshot)."""
+    graph = await asyncio.to_thread(
+        create_graph_connection, database_name, username, password, db_url, cache is None, snapshot
+    )
+    database_cache = None
+    if cache is not None:
+        database_cache = await asyncio.to_thread(cached_schema, graph, cache, db_url, database_name)
+    if snapshot is not None:
+        driver = FakeAsyncDriver(graph)
+    else:
+        driver = neo4j.AsyncGraphDatabase.driver(db_url, auth=(username, password))
+    return AsyncGraphConnection(graph, driver, database_name, database_cache)
+
+
+def _snapshot_query_key(query: str, params: Optional[dict] = None) -> str:
+    """Key of a query in a `GraphSnapshot`: whitespace-normalized text and sorted parameters."""
+    text = " ".join(query.split()).rstrip(";")
+    return json.dumps([text, params or {}], sort_keys=True, default=convert_datetime)
+
+class GraphSnapshot:
+    """Recorded state of one or more databases, used by the local stand-in backend.
+
+    For each database the snapshot holds the schema, the fingerprint and label
+    count rows, a pool of sampled paths and the rows of recorded queries.
+    It is stored as a single JSON file, also read by the fake MCP tools of the
+    evaluation notebook.
+
+    Args:
+        path: Snapshot file
+    """
+
+    def __init__(self, path: str = "graph_snapshot.json"):
+        self.path = path
+        self.databases = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.databases = json.load(f)["databases"]
+
+    def database(self, database_name: str) -> dict:
+        if database_name not in self.databases:
+            raise KeyError(f"Database {database_name} is not in the snapshot {self.path}")
+        return self.databases[database_name]
+
+    def capture(self, graph: Neo4jGraph, database_name: str, sampling: Optional[dict] = None,
+                rounds: int = 8):
+        """Record the schema, statistics and a path pool of a live database."""
+        graph.refresh_schema()
+        self.databases[database_name] = {
+            "schema": graph.schema,
+            "structured_schema": graph.structured_schema,
+            "fingerprint": graph.query(fingerprint_query),
+            "label_counts": graph.query(label_counts_query),
+            "paths": build_path_pool(graph, sampling, rounds),
+            "queries": self.databases.get(database_name, {}).get("queries", {}),
+        }
+
+    def add_query(self, database_name: str, query: str, rows: list, params: Optional[dict] = None):
+        self.database(database_name)["queries"][_snapshot_query_key(query, params)] = rows
+
+    def add_records(self, records: list):
+        """Record the results of generated records (e.g. a previous `generated_dataset.json`)."""
+        for record in records:
+            if record.get("database") in self.databases and "result" in record:
+                self.add_query(record["database"], record["cypher"], record["result"])
+
+    def save(self):
+        serialized = json.dumps({"databases": self.databases}, default=convert_datetime)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(serialized)
+        os.replace(tmp_path, self.path)
+
+class _FakeRecord:
+    def __init__(self, row: dict):
+        self._row = row
+
+    def data(self) -> dict:
+        return dict(self._row)
+
+class _FakeSummary:
+    def __init__(self, plan: Optional[dict], profile: Optional[dict]):
+        self.plan = plan
+        self.profile = profile
+
+class FakeNeo4jGraph:
+    """In-process stand-in for `Neo4jGraph` answering from a `GraphSnapshot`.
+
+    Sampling and fingerprint queries are served from the recorded statistics
+    and path pool (path draws are deterministic for given start nodes), other
+    queries from the recorded query rows. Unknown queries return no rows and
+    are counted in `misses`. EXPLAIN and PROFILE return a single-operator plan
+    estimating the recorded row count. An optional `latency` in seconds is
+    added to every query to simulate a remote server.
+    """
+
+    def __init__(self, snapshot: GraphSnapshot, database_name: str, latency: float = 0.0):
+        self.snapshot = snapshot
+        self.database_name = database_name
+        self.latency = latency
+        self.timeout = None
+        self.misses = []
+        self._data = snapshot.database(database_name)
+        self.schema = self._data["schema"]
+        self.structured_schema = self._data["structured_schema"]
+        self._driver = FakeDriver(self)
+
+    def refresh_schema(self):
+        self.schema = self._data["schema"]
+        self.structured_schema = self._data["structured_schema"]
+
+    def _rows(self, query: str, params: Optional[dict] = None, count_miss: bool = True) -> list:
+        text = " ".join(query.split())
+        params = params or {}
+        if text == " ".join(fingerprint_query.split()):
+            return self._data["fingerprint"]
+        if text == " ".join(label_counts_query.split()):
+            return self._data["label_counts"]
+        if text.startswith("MATCH (n:`") and "SKIP $skip LIMIT $limit" in text:
+            label = text[len("MATCH (n:`"):text.index("`)")]
+            return [{"id": f"{label}:{params['skip'] + i}"} for i in range(params["limit"])]
+        if text.startswith("UNWIND $start_ids AS start_id"):
+            rng = random.Random(json.dumps(params, sort_keys=True))
+            paths = self._data["paths"]
+            paths = rng.sample(paths, min(params["limit"], len(paths)))
+            return sorted(paths, key=lambda path: path.get("pathLength", 0), reverse=True)
+        key = _snapshot_query_key(query, params)
+        if key not in self._data["queries"]:
+            if count_miss:
+                self.misses.append(query)
+            return []
+        return self._data["queries"][key]
+
+    def execute(self, query: str, params: Optional[dict] = None) -> tuple:
+        """Return the rows and result summary of a query, with EXPLAIN/PROFILE support."""
+        match = re.match(r"\s*(EXPLAIN|PROFILE)\s+", query, re.IGNORECASE)
+        mode = match.group(1).upper() if match else None
+        rows = self._rows(query[match.end():] if match else query, params, mode != "EXPLAIN")
+        plan = {
+            "operatorType": "ProduceResults@neo4j",
+            "args": {"EstimatedRows": float(len(rows)), "Details": ""},
+            "children": [],
+        }
+        if mode == "EXPLAIN":
+            return [], _FakeSummary(plan, None)
+        if mode == "PROFILE":
+            return rows, _FakeSummary(plan, {**plan, "dbHits": 0, "rows": len(rows)})
+        return rows, _FakeSummary(None, None)
+
+    def query(self, query: str, params: Optional[dict] = None) -> list:
+        if self.latency:
+            time.sleep(self.latency)
+        rows, _ = self.execute(query, params)
+        return [dict(row) for row in rows]
+
+    def close(self):
+        pass
+
+class FakeDriver:
+    """Synchronous driver surface (`execute_query`) of a `FakeNeo4jGraph`."""
+
+    def __init__(self, graph: FakeNeo4jGraph):
+        self.graph = graph
+
+    def execute_query(self, query: Any, parameters_: Optional[dict] = None, **kwargs) -> tuple:
+        if self.graph.latency:
+            time.sleep(self.graph.latency)
+        rows, summary = self.graph.execute(getattr(query, "text", query), parameters_)
+        return [_FakeRecord(row) for row in rows], summary, list(rows[0]) if rows else []
+
+    def close(self):
+        pass
+
+class FakeAsyncDriver:
+    """Asynchronous driver surface (`execute_query`) of a `FakeNeo4jGraph`."""
+
+    def __init__(self, graph: FakeNeo4jGraph):
+        self.graph = graph
+
+    async def execute_query(self, query: Any, parameters_: Optional[dict] = None, **kwargs) -> tuple:
+        if self.graph.latency:
+            await asyncio.sleep(self.graph.latency)
+        rows, summary = self.graph.execute(getattr(query, "text", query), parameters_)
+        return [_FakeRecord(row) for row in rows], summary, list(rows[0]) if rows else []
+
+    async def close(self):
+        pass
+
+# Label and relationship type expressions of node and relationship patterns
+_pattern_names = re.compile(r"[(\[]\s*\w*\s*((?::\s*!?`?\w+`?\s*(?:[|&]\s*)?)+)")
+
+class FakeSchemaValidator:
+    """Stand-in for CyVer's `SchemaValidator` checking labels and relationship types.
+
+    The score is the fraction of `:Name` tokens of the query (labels and
+    relationship types) found in the snapshot schema.
+    """
+
+    def __init__(self, graph: FakeNeo4jGraph):
+        schema = graph.structured_schema
+        self.names = set(schema.get("node_props", {})) | set(schema.get("rel_props", {}))
+        self.names |= {rel["type"] for rel in schema.get("relationships", [])}
+
+    def validate(self, query: str, database_name: Optional[str] = None) -> tuple:
+        query = re.sub(r"'[^']*'|\"[^\"]*\"", "''", query)
+        names = [
+            name
+            for group in _pattern_names.findall(query)
+            for name in re.findall(r"`?(\w+)`?", group)
+        ]
+        if not names:
+            return 1.0, []
+        unknown = [name for name in names if name not in self.names]
+        return 1.0 - len(unknown) / len(names), [{"unknown": name} for name in unknown]
+
+def _schema_validator(graph: Any) -> Any:
+    """CyVer validator of a graph, or its stand-in for a `FakeNeo4jGraph`."""
+    if isinstance(graph, FakeNeo4jGraph):
+        return FakeSchemaValidator(graph)
+    return SchemaValidator(graph._driver)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Return True for rate-limit and overload errors raised by LLM clients."""
+    status = getattr(error, "status_code", None)
+    response = getattr(error, "response", None)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None)
+    if status in (429, 503, 529):
+        return True
+    name = type(error).__name__
+    return any(marker in name for marker in ("RateLimit", "Overloaded", "ResourceExhausted"))
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Return the Retry-After delay of an error response, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    """Adaptive (AIMD) concurrency limiter for LLM calls.
+
+    The concurrency limit grows additively while requests succeed (about one
+    extra slot per `limit` successes) and is cut multiplicatively on
+    rate-limit or overload errors, at most once per window of in-flight
+    requests. After such an error no new request starts before the
+    Retry-After delay (or an exponential backoff) has passed.
+
+    Use `async with limiter:` as a drop-in replacement for a semaphore, or
+    `await limiter.run(func, *args)` to also retry rate-limited calls.
+
+    Args:
+        initial: Initial concurrency limit
+        min_limit: Lower bound of the limit
+        max_limit: Upper bound of the limit
+        decrease_factor: Factor applied to the limit on rate-limit errors
+        max_retries: Retries of a rate-limited call in `run`
+        base_delay: Backoff in seconds when the error has no Retry-After
+    """
+
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 64,
+                 decrease_factor: float = 0.5, max_retries: int = 5, base_delay: float = 1.0):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.in_flight = 0
+        self.rate_limited = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._condition = None
+        self._started = {}
+
+    def _get_condition(self) -> asyncio.Condition:
+        # Created lazily so that the limiter can be built outside an event loop
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self) -> float:
+        """Wait for a free slot and return the time the request started."""
+        condition = self._get_condition()
+        async with condition:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    try:
+                        await asyncio.wait_for(condition.wait(), pause)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                if self.in_flight < int(self.limit):
+                    break
+                await condition.wait()
+            self.in_flight += 1
+        return time.monotonic()
+
+    async def release(self, started: float, error: Optional[Exception] = None,
+                      attempt: int = 0):
+        """Free a slot and adapt the limit to the outcome of the request."""
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            if error is not None and is_rate_limit_error(error):
+                self.rate_limited += 1
+                # Requests started before the last decrease saw the old limit
+                if started >= self._last_decrease:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._last_decrease = time.monotonic()
+                delay = retry_after_seconds(error)
+                if delay is None:
+                    delay = self.base_delay * 2 ** attempt
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            elif error is None:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            condition.notify_all()
+
+    async def run(self, func, *args, **kwargs):
+        """Call `await func(*args, **kwargs)` within the limit, retrying rate-limited calls."""
+        for attempt in range(self.max_retries + 1):
+            started = await self.acquire()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                await self.release(started, e, attempt)
+                if is_rate_limit_error(e) and attempt < self.max_retries:
+                    continue
+                raise
+            await self.release(started)
+            return result
+
+    async def __aenter__(self):
+        self._started[asyncio.current_task()] = await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        started = self._started.pop(asyncio.current_task())
+        await self.release(started, exc)
+
+    def __repr__(self):
+        return (
+            f"AdaptiveLimiter(limit={self.limit:.1f}, in_flight={self.in_flight}, "
+            f"rate_limited={self.rate_limited})"
+        )
+
+
+def supports_prompt_caching(model: Any) -> bool:
+    """Return True for providers that accept explicit cache breakpoints."""
+    return model._llm_type == "anthropic-chat"
+
+
+def _cached_block(text: str) -> dict:
+    return {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}
+
+
+class PromptCacheStats:
+    """Accumulate prompt cache hit/miss token counts over a run."""
+
+    def __init__(self):
+        self.requests = 0
+        self.input_tokens = 0
+        self.cache_read_tokens = 0
+        self.cache_creation_tokens = 0
+
+    def record(self, response: Any):
+        usage = getattr(response, "usage_metadata", None) or {}
+        if not usage:
+            # Responses served from an `LLMResponseCache` did not reach the provider
+            return
+        details = usage.get("input_token_details") or {}
+        self.requests += 1
+        self.input_tokens += usage.get("input_tokens", 0)
+        self.cache_read_tokens += details.get("cache_read", 0) or 0
+        self.cache_creation_tokens += details.get("cache_creation", 0) or 0
+
+    def summary(self) -> dict:
+        return {
+            "requests": self.requests,
+            "input_tokens": self.input_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cache_creation_tokens": self.cache_creation_tokens,
+            "cache_hit_ratio": (
+                self.cache_read_tokens / self.input_tokens if self.input_tokens else 0.0
+            ),
+        }
+
+    def __repr__(self):
+        summary = self.summary()
+        return (
+            f"PromptCacheStats(requests={summary['requests']}, input_tokens={summary['input_tokens']}, "
+            f"cache_read={summary['cache_read_tokens']}, cache_creation={summary['cache_creation_tokens']}, "
+            f"hit_ratio={summary['cache_hit_ratio']:.1%})"
+        )
+
+
+def _serialize_message(message: Any) -> list:
+    if isinstance(message, tuple):
+        return list(message)
+    return [message.type, message.content]
+
+
+class LLMResponseCache:
+    """Content-addressed on-disk cache of chat model responses.
+
+    Responses are stored in SQLite, keyed by the model identifier, its
+    temperature, the call arguments and a hash of the message list. The cache
+    holds at most `max_entries` responses and evicts the least recently used
+    ones. In replay mode the cache file, which must exist, is opened read-only
+    and a miss raises `KeyError` instead of calling the model.
+
+    The generation prompt contains the sampled paths, so generation responses
+    are only found again when the paths are: use a `GraphCache`, whose path
+    pool is drawn from with the unit as seed (`draw_paths`). Without it paths
+    are sampled at random from the database and every generation call misses.
+
+    Args:
+        path: SQLite database file
+        max_entries: Maximum number of cached responses
+        replay: Serve responses from the cache only
+    """
+
+    def __init__(self, path: str = ".llm_cache.sqlite", max_entries: int = 50000,
+                 replay: bool = False):
+        self.path = path
+        self.max_entries = max_entries
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        if replay:
+            # Read-only, a replayed run never writes to the cache it is served from
+            uri = f"{Path(path).resolve().as_uri()}?mode=ro"
+            self._connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, response TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)"
+            )
+            self._connection.commit()
+        self._size = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def key(self, model: Any, messages: list, **kwargs) -> str:
+        payload = {
+            "model": _model_name(model),
+            "temperature": getattr(model, "temperature", None),
+            "kwargs": kwargs,
+            "messages": [_serialize_message(message) for message in messages],
+        }
+        serialized = json.dumps(payload, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[AIMessage]:
+        row = self._connection.execute(
+            "SELECT response FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if not self.replay:
+            self._connection.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            self._connection.commit()
+        cached = json.loads(row[0])
+        return AIMessage(content=cached["content"], response_metadata=cached["response_metadata"])
+
+    def put(self, key: str, response: Any):
+        if self.replay:
+            return
+        serialized = json.dumps({
+            "content": response.content,
+            "response_metadata": getattr(response, "response_metadata", {}),
+        }, default=str)
+        exists = self._connection.execute(
+            "SELECT 1 FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        self._connection.execute(
+            "INSERT OR REPLACE INTO responses (key, response, last_used) VALUES (?, ?, ?)",
+            (key, serialized, time.time()),
+        )
+        if not exists:
+            self._size += 1
+        if self._size > self.max_entries:
+            self._connection.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                (self._size - self.max_entries,),
+            )
+            self._size = self.max_entries
+        self._connection.commit()
+
+    def _lookup(self, model: Any, messages: list, kwargs: dict) -> tuple:
+        key = self.key(model, messages, **kwargs)
+        response = self.get(key)
+        if response is not None:
+            self.hits += 1
+        elif self.replay:
+            raise KeyError(f"No cached response for {_model_name(model)} in replay mode")
+        else:
+            self.misses += 1
+        return key, response
+
+    def invoke(self, model: Any, messages: list, **kwargs) -> Any:
+        key, response = self._lookup(model, messages, kwargs)
+        if response is None:
+            response = model.invoke(messages, **kwargs)
+            self.put(key, response)
+        return response
+
+    async def ainvoke(self, model: Any, messages: list, **kwargs) -> Any:
+        key, response = self._lookup(model, messages, kwargs)
+        if response is None:
+            response = await model.ainvoke(messages, **kwargs)
+            self.put(key, response)
+        return response
+
+    def close(self):
+        self._connection.close()
+
+    def __repr__(self):
+        return (
+            f"LLMResponseCache(path={self.path!r}, entries={self._size}, "
+            f"hits={self.hits}, misses={self.misses}, replay={self.replay})"
+        )
+
+
+def _invoke(model: Any, messages: list, llm_cache: Optional[LLMResponseCache], **kwargs) -> Any:
+    if llm_cache is None:
+        return model.invoke(messages, **kwargs)
+    return llm_cache.invoke(model, messages, **kwargs)
+
+
+async def _ainvoke(model: Any, messages: list, llm_cache: Optional[LLMResponseCache], **kwargs) -> Any:
+    if llm_cache is None:
+        return await model.ainvoke(messages, **kwargs)
+    return await llm_cache.ainvoke(model, messages, **kwargs)
+
+
+def _generation_messages(schema: str, paths: Any, system_prompt: str,
+                         cache_prompt: bool = False) -> list:
+    """Build the generation messages.
+
+    With `cache_prompt`, the static system prompt and the per-database schema
+    are sent as cacheable prefixes, followed by the sampled paths.
+    """
+    if not cache_prompt:
+        return [
+            ("system", system_prompt),
+            ("human", user_prompt.format(schema=schema, paths=paths)),
+        ]
+    return [
+        SystemMessage(content=[_cached_block(system_prompt)]),
+        HumanMessage(content=[
+            _cached_block(user_schema_prompt.format(schema=schema)),
+            {"type": "text", "text": user_paths_prompt.format(paths=paths)},
+        ]),
     ]
-    response = model.invoke(messages, max_tokens=25000)
+
+
+def generate_qa_pairs(graph: Neo4jGraph, model: ChatAnthropic, system_prompt: str,
+                      sampling: Optional[dict] = None,
+                      database_cache: Optional[DatabaseCache] = None,
+                      cache_stats: Optional[PromptCacheStats] = None,
+                      llm_cache: Optional[LLMResponseCache] = None,
+                      seed: Optional[str] = None) -> list:
+    """Generate question-answer pairs using the LLM and graph data."""
+    if database_cache is None:
+        rows = sample_paths(graph, sampling)
+    else:
+        pool = database_cache.load("paths")
+        if pool is None:
+            pool = database_cache.store(
+                "paths", build_path_pool(graph, sampling, database_cache.pool_rounds)
+            )
+        rows = draw_paths(pool, sampling, seed)
+    paths = _value_sanitize(rows, max_chars=PATHS_CHAR_BUDGET)
+    messages = _generation_messages(
+        graph.schema, paths, system_prompt, supports_prompt_caching(model)
+    )
+    response = _invoke(model, messages, llm_cache, max_tokens=25000)
+    if cache_stats is not None:
+        cache_stats.record(response)
+    return extract_json_from_markdown(response.content)
+
+
+async def agenerate_qa_pairs(connection: AsyncGraphConnection, model: Any, system_prompt: str,
+                             database_limit: asyncio.Semaphore, model_limit: AdaptiveLimiter,
+                             sampling: Optional[dict] = None,
+                             cache_stats: Optional[PromptCacheStats] = None,
+                             llm_cache: Optional[LLMResponseCache] = None,
+                             seed: Optional[str] = None) -> list:
+    """Asynchronous counterpart of `generate_qa_pairs`."""
+    async with database_limit:
+        if connection.cache is None:
+            rows = await asample_paths(connection, sampling)
+        else:
+            rows = draw_paths(await connection.path_pool(sampling), sampling, seed)
+    paths = _value_sanitize(rows, max_chars=PATHS_CHAR_BUDGET)
+    messages = _generation_messages(
+        connection.schema, paths, system_prompt, supports_prompt_caching(model)
+    )
+    response = await model_limit.run(_ainvoke, model, messages, llm_cache, max_tokens=25000)
+    if cache_stats is not None:
+        cache_stats.record(response)
     return extract_json_from_markdown(response.content)
 
 
 def validate_and_execute_record(record: dict, schema_validator: SchemaValidator, 
-                               graph: Neo4jGraph, database_name: str) -> dict:
-    """Validate Cypher query and execute it, updating the record with results."""
+                               graph: Neo4jGraph, database_name: str,
+                               cost_guard: Optional[dict] = None) -> dict:
+    """Validate Cypher query and execute it, updating the record with results.
+
+    With a `cost_guard` (overriding `DEFAULT_COST_GUARD`), the query is first
+    EXPLAINed and queries exceeding the guard are rejected or flagged.
+    """
     # Validate against schema
     record["validated"] = validate_cypher(schema_validator, record["cypher"], database_name)
     
     if not record["validated"]:
         return record
+
+    guard = None if cost_guard is None else {**DEFAULT_COST_GUARD, **cost_guard}
+    if guard is not None:
+        try:
+            _, summary = _run_with_summary(graph, database_name, f"EXPLAIN {record['cypher']}")
+        except Exception:
+            record["validated"] = False
+            return record
+        if not _guard_accepts(record, summarize_plan(summary.plan), guard):
+            return record
     
     # Execute query and handle exceptions
+    start = time.perf_counter()
     try:
-        response = graph.query(record["cypher"])
+        if guard is not None and guard["profile"]:
+            response, summary = _run_with_summary(graph, database_name, f"PROFILE {record['cypher']}")
+            record["plan"] = summarize_plan(summary.profile)
+        else:
+            response = graph.query(record["cypher"])
         record["result"] = response
         
         # Check if result meets criteria (single non-empty, non-zero value)
@@ -191,44 +1348,272 @@ def validate_and_execute_record(record: dict, schema_validator: SchemaValidator,
             
     except Exception:
         record["validated"] = False
+    record["execution_time"] = time.perf_counter() - start
     
     return record
 
+
+async def avalidate_and_execute_record(record: dict, connection: AsyncGraphConnection,
+                                       timeout: Optional[float] = None,
+                                       cost_guard: Optional[dict] = None) -> dict:
+    """Asynchronous counterpart of `validate_and_execute_record`.
+
+    Queries running longer than `timeout` seconds are cancelled and the record
+    is marked as not validated. The execution time is stored in the record.
+    """
+    record["validated"] = await asyncio.to_thread(
+        validate_cypher, connection.schema_validator, record["cypher"], connection.database_name
+    )
+
+    if not record["validated"]:
+        return record
+
+    guard = None if cost_guard is None else {**DEFAULT_COST_GUARD, **cost_guard}
+    if guard is not None:
+        try:
+            _, summary = await connection.run(f"EXPLAIN {record['cypher']}", timeout=timeout)
+        except Exception:
+            record["validated"] = False
+            return record
+        if not _guard_accepts(record, summarize_plan(summary.plan), guard):
+            return record
+
+    start = time.perf_counter()
+    try:
+        if guard is not None and guard["profile"]:
+            response, summary = await connection.run(f"PROFILE {record['cypher']}", timeout=timeout)
+            record["plan"] = summarize_plan(summary.profile)
+        else:
+            response = await connection.query(record["cypher"], timeout=timeout)
+        record["result"] = response
+
+        # Check if result meets criteria (single non-empty, non-zero value)
+        if not response or len(response) > 1:
+            record["validated"] = False
+
+    except asyncio.TimeoutError:
+        record["validated"] = False
+        record["timed_out"] = True
+    except Exception:
+        record["validated"] = False
+    record["execution_time"] = time.perf_counter() - start
+
+    return record
+
+
+async def avalidate_and_execute_records(records: list, connection: AsyncGraphConnection,
+                                        limit: asyncio.Semaphore,
+                                        timeout: Optional[float] = None,
+                                        cost_guard: Optional[dict] = None) -> list:
+    """Validate and execute a batch of records concurrently.
+
+    `limit` caps the number of records in flight against the database; it is
+    typically shared by every batch targeting the same database.
+    """
+    async def run(record):
+        async with limit:
+            return await avalidate_and_execute_record(record, connection, timeout, cost_guard)
+
+    return await asyncio.gather(*(run(record) for record in records))
+
 def process_database(database: list, model: Any, 
                     iterations_per_database: int,
-                    system_prompt: str = system_prompt) -> list:
-    """Process a single database and return all generated records."""
+                    system_prompt: str = system_prompt,
+                    writer: Optional[JsonlWriter] = None,
+                    sampling: Optional[dict] = None,
+                    cache: Optional[GraphCache] = None,
+                    cache_stats: Optional[PromptCacheStats] = None,
+                    llm_cache: Optional[LLMResponseCache] = None,
+                    cost_guard: Optional[dict] = None,
+                    snapshot: Optional[GraphSnapshot] = None) -> list:
+    """Process a single database and return all generated records.
+
+    When a `JsonlWriter` is given, records are streamed to it instead of being
+    returned, and iterations already checkpointed in its file are skipped.
+    `sampling` overrides the path sampling options (see `DEFAULT_SAMPLING`).
+    With a `GraphCache`, the schema and sampled paths are read from disk.
+    Prompt cache usage is accumulated in `cache_stats` when given, and LLM
+    responses are served from `llm_cache` when given. `cost_guard` enables the
+    EXPLAIN cost guard (see `DEFAULT_COST_GUARD`) before executing queries.
+    With a `GraphSnapshot`, the database is replaced by a local `FakeNeo4jGraph`.
+    """
     if 'database' not in database:
         database_name = 'neo4j'
     else:
         database_name = database['database']
-    graph = create_graph_connection(database_name, database['username'], database['password'], database['uri'])
-    schema_validator = SchemaValidator(graph._driver)
+    units = [
+        generation_unit(model, database['uri'], database_name, system_prompt, i)
+        for i in range(iterations_per_database)
+    ]
+    if writer is not None:
+        units = [unit for unit in units if not writer.is_complete(unit)]
+    if not units:
+        return []
+
+    graph = create_graph_connection(database_name, database['username'], database['password'], database['uri'], cache is None, snapshot)
+    database_cache = None
+    if cache is not None:
+        database_cache = cached_schema(graph, cache, database['uri'], database_name)
+    schema_validator = _schema_validator(graph)
     database_output = []
     
-    for i in tqdm(range(iterations_per_database), 
+    for unit in tqdm(units, 
                   desc=f"Iterations for {database_name}", 
                   leave=False):
         try:
             # Generate QA pairs
-            data = generate_qa_pairs(graph, model, system_prompt)
+            data = generate_qa_pairs(
+                graph, model, system_prompt, sampling, database_cache, cache_stats,
+                llm_cache, seed=json.dumps(unit, sort_keys=True)
+            )
             # Validate and execute each record
             for record in data:
                 # Add model name
                 record["model"] = model._llm_type
                 # Add database name
                 record["database"] = database_name
+                record["unit"] = unit
                 validated_record = validate_and_execute_record(
-                    record, schema_validator, graph, database_name
+                    record, schema_validator, graph, database_name, cost_guard
                 )
-                database_output.append(validated_record)
+                if writer is not None:
+                    writer.write_record(validated_record)
+                else:
+                    # The unit is only needed to checkpoint the writer's file
+                    validated_record.pop("unit", None)
+                    database_output.append(validated_record)
+            if writer is not None:
+                writer.mark_complete(unit)
         except:
             raise
             continue
     
     return database_output
 
-async def process_example(example, qa_model):
+async def _process_unit(unit: dict, connection: AsyncGraphConnection, model: Any,
+                        system_prompt: str, database_limit: asyncio.Semaphore,
+                        model_limit: AdaptiveLimiter,
+                        writer: Optional[JsonlWriter],
+                        sampling: Optional[dict],
+                        cache_stats: Optional[PromptCacheStats],
+                        llm_cache: Optional[LLMResponseCache],
+                        query_timeout: Optional[float],
+                        cost_guard: Optional[dict]) -> list:
+    """Generate, validate and execute the records of a single generation unit."""
+    try:
+        data = await agenerate_qa_pairs(
+            connection, model, system_prompt, database_limit, model_limit, sampling, cache_stats,
+            llm_cache, seed=json.dumps(unit, sort_keys=True)
+        )
+        for record in data:
+            record["model"] = model._llm_type
+            record["database"] = connection.database_name
+            record["unit"] = unit
+        records = await avalidate_and_execute_records(
+            data, connection, database_limit, query_timeout, cost_guard
+        )
+        if writer is None:
+            # The unit is only needed to checkpoint the writer's file
+            for record in records:
+                record.pop("unit", None)
+            return records
+        for record in records:
+            writer.write_record(record)
+        writer.mark_complete(unit)
+        return []
+    except Exception as e:
+        # Leave the unit without a checkpoint so that a resumed run retries it
+        print(f"Error processing {unit}: {e}")
+        return []
+
+
+async def agenerate_dataset(models: list, databases: list, prompts: list,
+                            writer: Optional[JsonlWriter] = None,
+                            max_concurrent_per_provider: int = 4,
+                            max_concurrent_per_database: int = 4,
+                            sampling: Optional[dict] = None,
+                            cache: Optional[GraphCache] = None,
+                            cache_stats: Optional[PromptCacheStats] = None,
+                            llm_cache: Optional[LLMResponseCache] = None,
+                            query_timeout: Optional[float] = 30.0,
+                            cost_guard: Optional[dict] = None,
+                            model_limiters: Optional[dict] = None,
+                            snapshot: Optional[GraphSnapshot] = None) -> list:
+    """Generate records for every model, database, prompt and iteration concurrently.
+
+    Args:
+        models: Chat models used to generate question-answer pairs
+        databases: Database configurations ({"uri", "username", "password", "database"})
+        prompts: List of (system_prompt, iterations) pairs
+        writer: Optional `JsonlWriter`; completed units are skipped and records
+            are streamed to it instead of being returned
+        max_concurrent_per_provider: Initial concurrent LLM calls per provider,
+            adapted to rate limits by an `AdaptiveLimiter`
+        max_concurrent_per_database: Maximum concurrent queries per database, shared
+            by path sampling and the execution of generated Cypher
+        sampling: Options overriding `DEFAULT_SAMPLING` for path sampling
+        cache: Optional `GraphCache` for schema snapshots and path pools
+        cache_stats: Optional `PromptCacheStats` accumulating prompt cache usage
+        llm_cache: Optional `LLMResponseCache` serving previously seen LLM responses
+        query_timeout: Transaction timeout in seconds for each generated query
+        cost_guard: Settings overriding `DEFAULT_COST_GUARD` to EXPLAIN queries
+            before executing them (None disables the guard)
+        model_limiters: Optional `AdaptiveLimiter` per provider (`model._llm_type`)
+            to share with other stages; missing ones are created
+        snapshot: Optional `GraphSnapshot` replacing the databases with local fakes
+
+    Returns:
+        The generated records when no writer is given, otherwise an empty list.
+    """
+    # Connection arguments per (server URL, database name)
+    targets = {}
+    for database in databases:
+        database_name = database.get('database', 'neo4j')
+        targets[(database['uri'], database_name)] = (
+            database_name, database['username'], database['password'], database['uri']
+        )
+    units = [
+        (generation_unit(model, uri, name, prompt, i), model, (uri, name), prompt)
+        for model in models
+        for uri, name in targets
+        for prompt, iterations in prompts
+        for i in range(iterations)
+    ]
+    if writer is not None:
+        units = [u for u in units if not writer.is_complete(u[0])]
+    if not units:
+        return []
+
+    connections = {}
+    for target in {u[2] for u in units}:
+        connections[target] = await acreate_graph_connection(
+            *targets[target], cache=cache, snapshot=snapshot
+        )
+    database_limits = {
+        target: asyncio.Semaphore(max_concurrent_per_database) for target in connections
+    }
+    model_limits = dict(model_limiters or {})
+    for model in models:
+        if model._llm_type not in model_limits:
+            model_limits[model._llm_type] = AdaptiveLimiter(initial=max_concurrent_per_provider)
+
+    try:
+        tasks = [
+            _process_unit(
+                unit, connections[target], model, prompt,
+                database_limits[target], model_limits[model._llm_type], writer, sampling,
+                cache_stats, llm_cache, query_timeout, cost_guard
+            )
+            for unit, model, target, prompt in units
+        ]
+        results = await tqdm_asyncio.gather(*tasks, desc="Generating dataset")
+    finally:
+        for connection in connections.values():
+            await connection.close()
+
+    return [record for records in results for record in records]
+
+async def process_example(example, qa_model, cache_stats=None, llm_cache=None, limiter=None):
     """Process a single example asynchronously"""
     if not example.get('validated'):
         return  # Skip unvalidated examples
@@ -241,15 +1626,23 @@ async def process_example(example, qa_model):
             result=example['result']
         )),
     ]
+    if supports_prompt_caching(qa_model):
+        # Mark the shared system prompt as a cacheable prefix
+        qa_messages[0] = SystemMessage(content=[_cached_block(qa_system_prompt)])
     
-    answer = await qa_model.ainvoke(qa_messages)
+    if limiter is not None:
+        answer = await limiter.run(_ainvoke, qa_model, qa_messages, llm_cache)
+    else:
+        answer = await _ainvoke(qa_model, qa_messages, llm_cache)
+    if cache_stats is not None:
+        cache_stats.record(answer)
     example['answer'] = answer.content  # Modify original dict in-place
 
 # Main concurrent processing
-async def process_all_examples(data, qa_model):
+async def process_all_examples(data, qa_model, cache_stats=None, llm_cache=None, limiter=None):
     """Process all examples concurrently with progress bar"""
     tasks = [
-        process_example(example, qa_model)
+        process_example(example, qa_model, cache_stats, llm_cache, limiter)
         for example in data
     ]
     
@@ -257,13 +1650,20 @@ async def process_all_examples(data, qa_model):
     await tqdm_asyncio.gather(*tasks, desc="Generating text answers")
 
 # Alternative with semaphore for rate limiting
-async def process_all_examples_with_limit(data, qa_model, max_concurrent=10):
-    """Process all examples concurrently with a limit on concurrent requests"""
+async def process_all_examples_with_limit(data, qa_model, max_concurrent=10, cache_stats=None,
+                                          llm_cache=None, limiter=None):
+    """Process all examples concurrently with a limit on concurrent requests
+
+    When an `AdaptiveLimiter` is given, it replaces the fixed `max_concurrent` limit.
+    """
+    if limiter is not None:
+        return await process_all_examples(data, qa_model, cache_stats, llm_cache, limiter)
+
     semaphore = asyncio.Semaphore(max_concurrent)
     
     async def process_with_semaphore(example):
         async with semaphore:
-            await process_example(example, qa_model)
+            await process_example(example, qa_model, cache_stats, llm_cache)
     
     tasks = [process_with_semaphore(example) for example in data]
     await tqdm_asyncio.gather(*tasks, desc="Processing examples")
@@ -0,0 +1,213 @@
+"""Throughput benchmarks of the dataset generation pipeline.
+
+Every case runs on synthetic data, a local `GraphSnapshot` stand-in and a fake
+LLM, so neither a Neo4j server nor an API key is needed. Results (records/sec
+and latency percentiles per iteration) are compared with the stored baseline
+and cases whose median latency grew by more than the tolerance are flagged.
+
+    python benchmark.py                    # run and compare with the baseline
+    python benchmark.py --save-baseline    # store the results as the new baseline
+    python benchmark.py --only sanitize    # run the cases whose name contains "sanitize"
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+# The runner shared by the benchmarks lives at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from benchmark_runner import measure, run_benchmarks
+from utils import (
+    _value_sanitize,
+    extract_json_from_markdown,
+    validate_cypher,
+    process_database,
+    GraphSnapshot,
+    FakeNeo4jGraph,
+    FakeSchemaValidator,
+    PATHS_CHAR_BUDGET,
+)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+LABELS = ["Organization", "Person", "City", "Country", "Article", "Industry"]
+REL_TYPES = ["HAS_SUBSIDIARY", "HAS_CEO", "IN_CITY", "IN_COUNTRY", "MENTIONS", "HAS_CATEGORY"]
+
+
+def _node(rng: random.Random, depth: int = 0) -> dict:
+    props = {
+        "name": f"node-{rng.randint(0, 10 ** 6)}",
+        "summary": " ".join(rng.choice(["graph", "data", "company", "city"]) for _ in range(40)),
+        "revenue": rng.random() * 1e9,
+        "embedding": [rng.random() for _ in range(256)],
+        "tags": [f"tag-{i}" for i in range(rng.randint(1, 80))],
+    }
+    if depth < 3:
+        props["nested"] = {"child": _node(rng, depth + 1), "items": [_node(rng, 3) for _ in range(2)]}
+    return {"labels": [rng.choice(LABELS)], "props": props}
+
+
+def synthetic_paths(count: int, seed: int = 0) -> list:
+    """Path rows shaped like the output of the path sampling query, with large nested properties."""
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(count):
+        length = rng.randint(2, 4)
+        nodes = [_node(rng) for _ in range(length + 1)]
+        rels = [{"type": rng.choice(REL_TYPES), "props": {"weight": rng.random()}} for _ in range(length)]
+        signature = "".join(
+            f"(:{node['labels'][0]})-[:{rel['type']}]->" for node, rel in zip(nodes, rels)
+        ) + f"(:{nodes[-1]['labels'][0]})"
+        paths.append({"pathLength": length, "nodesInfo": nodes, "relsInfo": rels, "pathSignature": signature})
+    return paths
+
+
+def synthetic_cyphers(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [
+        f"MATCH (a:{rng.choice(LABELS)} {{name: 'node-{i}'}})-[:{rng.choice(REL_TYPES)}]->"
+        f"(b:{rng.choice(LABELS)}) RETURN count(b) AS value_{i}"
+        for i in range(count)
+    ]
+
+
+def synthetic_snapshot(database_name: str = "benchmark", paths: int = 200, queries: int = 500) -> GraphSnapshot:
+    """In-memory snapshot of a synthetic database."""
+    snapshot = GraphSnapshot(os.path.join(tempfile.mkdtemp(), "snapshot.json"))
+    snapshot.databases[database_name] = {
+        "schema": "\n".join(f"{label} {{name: STRING, summary: STRING}}" for label in LABELS),
+        "structured_schema": {
+            "node_props": {label: [] for label in LABELS},
+            "rel_props": {},
+            "relationships": [{"start": LABELS[0], "type": rel, "end": LABELS[1]} for rel in REL_TYPES],
+        },
+        "fingerprint": [{"labels": {label: 1000 for label in LABELS}}],
+        "label_counts": [{"labels": {label: 1000 for label in LABELS}}],
+        "paths": synthetic_paths(paths),
+        "queries": {},
+    }
+    for i, cypher in enumerate(synthetic_cyphers(queries)):
+        snapshot.add_query(database_name, cypher, [{f"value_{i}": i}])
+    return snapshot
+
+
+def generation_response(records: int = 25, seed: int = 0) -> str:
+    """A generation LLM response with `records` question-answer pairs in a markdown JSON block."""
+    cyphers = synthetic_cyphers(records, seed)
+    data = [
+        {
+            "question": f"How many nodes are connected to node-{i}?",
+            "cypher": cypher,
+            "query_type": "Aggregation",
+            "complexity": "1-hop",
+            "noise_applied": False,
+        }
+        for i, cypher in enumerate(cyphers)
+    ]
+    return f"Here are the questions:\n```json\n{json.dumps(data, indent=2)}\n```"
+
+
+class FakeResponse:
+    def __init__(self, content: str):
+        self.content = content
+        self.usage_metadata = {"input_tokens": len(content) // 4, "output_tokens": len(content) // 4}
+
+
+class FakeChatModel:
+    """Chat model returning a fixed response, with an optional simulated latency."""
+
+    _llm_type = "fake-chat"
+
+    def __init__(self, content: str, latency: float = 0.0):
+        self.content = content
+        self.latency = latency
+
+    def invoke(self, messages, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return FakeResponse(self.content)
+
+    async def ainvoke(self, messages, **kwargs):
+        return self.invoke(messages, **kwargs)
+
+
+def check_count(expected: int, valid=bool):
+    """Check that a case produced `expected` outputs, all of them valid."""
+    def check(outputs: list):
+        count = sum(1 for output in outputs if valid(output))
+        assert count == expected == len(outputs), f"{count}/{expected} valid outputs out of {len(outputs)}"
+    return check
+
+
+def check_sanitized(expected: int):
+    """Check that `expected` paths were sanitized and that their embeddings were dropped."""
+    def check(paths: list):
+        assert len(paths) == expected, f"{len(paths)}/{expected} paths sanitized"
+        assert all("embedding" not in node["props"] for path in paths for node in path["nodesInfo"]), "embedding kept"
+    return check
+
+
+def bench_value_sanitize() -> dict:
+    # Path by path, without the budget which would stop after the first few paths
+    paths = synthetic_paths(100)
+    return measure(
+        lambda: [_value_sanitize(path) for path in paths], len(paths), 20,
+        check=check_sanitized(len(paths)),
+    )
+
+
+def bench_value_sanitize_budget() -> dict:
+    # Sampled paths within the prompt budget, counting only the paths kept
+    paths = synthetic_paths(100)
+    kept = len(_value_sanitize(paths, max_chars=PATHS_CHAR_BUDGET))
+    return measure(
+        lambda: _value_sanitize(paths, max_chars=PATHS_CHAR_BUDGET), kept, 200,
+        check=check_sanitized(kept),
+    )
+
+
+def bench_extract_json_from_markdown() -> dict:
+    response = generation_response(25)
+    return measure(
+        lambda: extract_json_from_markdown(response), 25, 200,
+        check=check_count(25, lambda record: "cypher" in record),
+    )
+
+
+def bench_validate_cypher_stand_in() -> dict:
+    # Times validate_cypher with FakeSchemaValidator, the snapshot stand-in, not CyVer
+    snapshot = synthetic_snapshot()
+    validator = FakeSchemaValidator(FakeNeo4jGraph(snapshot, "benchmark"))
+    cyphers = synthetic_cyphers(500)
+    return measure(
+        lambda: [validate_cypher(validator, cypher, "benchmark") for cypher in cyphers],
+        len(cyphers), 20,
+        check=check_count(len(cyphers)),
+    )
+
+
+def bench_process_database() -> dict:
+    snapshot = synthetic_snapshot()
+    model = FakeChatModel(generation_response(25))
+    return measure(
+        lambda: process_database(
+            "benchmark", "bolt://localhost", model, 4, snapshot=snapshot, cost_guard={}
+        ),
+        4 * 25, 10,
+        check=check_count(4 * 25, lambda record: record["validated"] and "result" in record),
+    )
+
+
+BENCHMARKS = {
+    "value_sanitize": bench_value_sanitize,
+    "value_sanitize_budget": bench_value_sanitize_budget,
+    "extract_json_from_markdown": bench_extract_json_from_markdown,
+    "validate_cypher_stand_in": bench_validate_cypher_stand_in,
+    "process_database": bench_process_database,
+}
+
+
+if __name__ == "__main__":
+    run_benchmarks(BENCHMARKS, __doc__, BASELINE_PATH)
@@ -0,0 +1,184 @@
+"""Throughput benchmarks of the MCP evaluation pipeline.
+
+Every case runs on synthetic records with a fake agent and judge LLM and the
+`SnapshotMCPBackend` stand-in, so neither an MCP server, a Neo4j database nor
+an API key is needed. Results (records/sec and latency percentiles per
+iteration) are compared with the stored baseline and cases whose median
+latency grew by more than the tolerance are flagged.
+
+    python benchmark.py                    # run and compare with the baseline
+    python benchmark.py --save-baseline    # store the results as the new baseline
+    python benchmark.py --only evaluation  # run the cases whose name contains "evaluation"
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+# The runner shared by the benchmarks lives at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from benchmark_runner import measure, run_benchmarks
+from utils import MCPGraphEvaluator, SnapshotMCPBackend, _snapshot_query_key, fast_path_score
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+EVALUATION_PROMPT = """Compare the generated answer with the real answer.
+Question: {question}
+Real answer: {reference}
+Generated answer: {generated_answer}
+
+Output format:
+<reasoning>...</reasoning>
+<score>0.4</score>
+"""
+
+
+def synthetic_records(count: int, seed: int = 0) -> list:
+    """Records shaped like the generated dataset, half of them numeric and half textual."""
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        value = rng.randint(1, 10 ** 6) if i % 2 == 0 else f"Company {i}"
+        records.append({
+            "question": f"What is the value of item {i}?",
+            "cypher": f"MATCH (o:Organization {{name: 'item-{i}'}}) RETURN o.value AS value",
+            "database": "benchmark",
+            "result": [{"value": value}],
+            "answer": f"The value of item {i} is {value}.",
+        })
+    return records
+
+
+def write_snapshot(records: list) -> str:
+    """Write a snapshot answering the Cypher of every record and return its path."""
+    queries = {_snapshot_query_key(r["cypher"]): r["result"] for r in records}
+    path = os.path.join(tempfile.mkdtemp(), "graph_snapshot.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"databases": {"benchmark": {
+            "schema": "Organization {name: STRING, value: INTEGER}",
+            "structured_schema": {"node_props": {"Organization": []}, "rel_props": {}, "relationships": []},
+            "queries": queries,
+        }}}, f)
+    return path
+
+
+class FakeResponse:
+    def __init__(self, content: str):
+        self.content = content
+        self.usage_metadata = {"input_tokens": len(content) // 4, "output_tokens": 20, "total_tokens": len(content) // 4 + 20}
+
+
+class FakeJudge:
+    """Judge LLM answering every record of a (batched) request with a fixed score."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    async def ainvoke(self, messages, **kwargs):
+        await asyncio.sleep(self.latency)
+        prompt = messages[-1][1]
+        ids = [line.split('"')[1] for line in prompt.splitlines() if line.startswith('<record id="')]
+        if not ids:
+            return FakeResponse("<reasoning>Close enough.</reasoning><score>0.8</score>")
+        return FakeResponse("".join(
+            f'<result id="{i}"><reasoning>Close enough.</reasoning><score>0.8</score></result>' for i in ids
+        ))
+
+
+class FakeAgent:
+    """Agent reading the schema, running the Cypher of the question and answering from its rows."""
+
+    def __init__(self, tools: list, cyphers: dict, latency: float = 0.0):
+        self.tools = {tool.name.split("-")[-1]: tool for tool in tools}
+        self.cyphers = cyphers
+        self.latency = latency
+
+    async def astream(self, inputs, config=None, stream_mode="updates"):
+        question = inputs["messages"][0]["content"]
+        calls = [
+            {"name": "get_neo4j_schema", "args": {}, "id": "schema", "type": "tool_call"},
+            {"name": "read_neo4j_cypher", "args": {"query": self.cyphers[question]}, "id": "read", "type": "tool_call"},
+        ]
+        usage = {"input_tokens": 1500, "output_tokens": 80, "total_tokens": 1580}
+        for call in calls:
+            await asyncio.sleep(self.latency)
+            yield {"agent": {"messages": [AIMessage(content="", tool_calls=[call], usage_metadata=usage)]}}
+            output = await self.tools[call["name"]].coroutine(**call["args"])
+            yield {"tools": {"messages": [ToolMessage(content=output, tool_call_id=call["id"])]}}
+        await asyncio.sleep(self.latency)
+        rows = json.loads(output)
+        answer = f"The answer is {next(iter(rows[0].values()))}." if rows else "I could not find it."
+        yield {"agent": {"messages": [AIMessage(content=answer, usage_metadata=usage)]}}
+
+
+def check_scores(expected: int):
+    """Check that every (score, reasoning) output of a case holds a score."""
+    def check(outputs: list):
+        scored = sum(output is not None and output[0] is not None for output in outputs)
+        assert scored == expected, f"{scored}/{expected} outputs scored"
+    return check
+
+
+def check_records(expected: int, method: str):
+    """Check that every record of a case was scored by the given method, without error."""
+    def check(results: list):
+        scored = sum(r.get("evaluation_method") == method and "error" not in r for r in results)
+        assert scored == expected, f"{scored}/{expected} records scored by {method}"
+    return check
+
+
+def bench_extract_score_and_reasoning() -> dict:
+    evaluator = MCPGraphEvaluator(EVALUATION_PROMPT, mcp_config={}, evaluation_llm=FakeJudge())
+    outputs = [
+        f"<reasoning>{'The generated answer matches the reference. ' * 20}</reasoning>\n<score>0.{i % 10}</score>"
+        for i in range(1000)
+    ]
+    return measure(
+        lambda: [evaluator.extract_score_and_reasoning(o) for o in outputs], len(outputs), 20,
+        check=check_scores(len(outputs)),
+    )
+
+
+def bench_fast_path_score() -> dict:
+    records = synthetic_records(1000)
+    return measure(
+        lambda: [fast_path_score(r["result"], r["answer"], r["question"]) for r in records], len(records), 20,
+        check=check_scores(len(records)),
+    )
+
+
+def _evaluation_case(judge_batch_size: int, fast_path: bool, method: str):
+    records = synthetic_records(200)
+    backend = SnapshotMCPBackend(write_snapshot(records), latency=0.001)
+    mcp_config = {"neo4j-graph": {
+        "command": "uvx",
+        "args": ["mcp-neo4j-cypher@0.2.4", "--namespace", "custom"],
+        "env": {"NEO4J_DATABASE": "benchmark"},
+    }}
+    evaluator = MCPGraphEvaluator(
+        EVALUATION_PROMPT, mcp_config=mcp_config, evaluation_llm=FakeJudge(latency=0.005),
+        max_concurrent=20, fast_path=fast_path, judge_batch_size=judge_batch_size,
+    )
+    cyphers = {r["question"]: r["cypher"] for r in records}
+    evaluator.agent = FakeAgent(backend.tools(mcp_config), cyphers, latency=0.002)
+    return measure(
+        lambda: asyncio.run(evaluator.evaluate_dataset(records)), len(records), 5,
+        check=check_records(len(records), method),
+    )
+
+
+BENCHMARKS = {
+    "extract_score_and_reasoning": bench_extract_score_and_reasoning,
+    "fast_path_score": bench_fast_path_score,
+    "evaluation_llm_judge": lambda: _evaluation_case(judge_batch_size=1, fast_path=False, method="llm"),
+    "evaluation_batched_judge": lambda: _evaluation_case(judge_batch_size=20, fast_path=False, method="llm_batch"),
+    "evaluation_fast_path": lambda: _evaluation_case(judge_batch_size=1, fast_path=True, method="fast_path"),
+}
+
+
+if __name__ == "__main__":
+    run_benchmarks(BENCHMARKS, __doc__, BASELINE_PATH)
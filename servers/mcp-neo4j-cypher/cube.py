@@ -0,0 +1,212 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import List, Dict, Any, Optional
+
+# Dimensions of the cube, every combination of their values is one cell
+CUBE_DIMENSIONS = ["database", "complexity", "query_type", "noise_type", "agent_model", "server", "recursion_limit"]
+
+# Numeric columns with a count, sum and sum of squares per cell
+CUBE_MEASURES = ["evaluation_score", "tool_count", "agent_latency", "input_tokens", "output_tokens"]
+
+# Value of missing dimensions, "Unknown" when not listed
+MISSING_LEVELS = {"noise_type": "No Noise"}
+
+# Parquet metadata entry holding the keys of the records added to a saved cube
+KEYS_METADATA = b"score_cube_keys"
+
+
+def _level(value: Any, missing: str) -> str:
+    """Dimension value as a string, whole numbers without decimals whatever the column dtype"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return missing
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class ScoreCube:
+    """Aggregate cube of evaluation results for fast slicing.
+
+    Every cell, one per combination of dimension values, holds the number of
+    records, the count, sum and sum of squares of every measure and a
+    histogram of scores. Any marginal or drill-down (mean, std and histogram
+    grouped by some dimensions, optionally filtered on others) is answered
+    from the cells without rescanning records, and records can be added as
+    they are evaluated; records added with a key are counted once, however
+    often they are added. Cubes of several runs or shards can be merged, and
+    saved to and loaded from Parquet.
+
+    Args:
+        dimensions: Columns to aggregate by (default: CUBE_DIMENSIONS)
+        measures: Numeric columns to aggregate (default: CUBE_MEASURES)
+        score: Column of the score histogram, with values in [0, 1]
+        bins: Number of histogram bins
+    """
+
+    def __init__(
+        self,
+        dimensions: Optional[List[str]] = None,
+        measures: Optional[List[str]] = None,
+        score: str = "evaluation_score",
+        bins: int = 10
+    ):
+        self.dimensions = list(dimensions or CUBE_DIMENSIONS)
+        self.measures = list(measures or CUBE_MEASURES)
+        self.score = score
+        self.bins = bins
+        self.cells = {}
+        self.keys = set()
+        self._frame = None
+
+    @property
+    def statistics(self) -> List[str]:
+        """Names of the statistics stored per cell"""
+        return [
+            "records",
+            *[f"{measure}_{stat}" for measure in self.measures for stat in ("count", "sum", "sum_sq")],
+            *[f"hist_{i}" for i in range(self.bins)],
+        ]
+
+    def _partial(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Statistics of records grouped by cell"""
+        columns = {}
+        for dimension in self.dimensions:
+            missing = MISSING_LEVELS.get(dimension, "Unknown")
+            values = df[dimension] if dimension in df.columns else pd.Series(missing, index=df.index)
+            columns[dimension] = values.map(lambda value: _level(value, missing))
+        columns["records"] = np.ones(len(df), dtype=np.int64)
+        for measure in self.measures:
+            if measure in df.columns:
+                values = pd.to_numeric(df[measure], errors="coerce")
+            elif measure == "tool_count" and "tools" in df.columns:
+                values = df["tools"].apply(lambda tools: len(tools) if isinstance(tools, list) else np.nan)
+            else:
+                values = pd.Series(np.nan, index=df.index)
+            present = values.notna()
+            columns[f"{measure}_count"] = present.astype(np.int64)
+            columns[f"{measure}_sum"] = values.fillna(0.0)
+            columns[f"{measure}_sum_sq"] = values.fillna(0.0) ** 2
+        scores = pd.to_numeric(df[self.score], errors="coerce") if self.score in df.columns else pd.Series(np.nan, index=df.index)
+        bin_index = np.clip(np.floor(scores.to_numpy(dtype=float) * self.bins), 0, self.bins - 1)
+        for i in range(self.bins):
+            columns[f"hist_{i}"] = (bin_index == i).astype(np.int64)
+        return pd.DataFrame(columns).groupby(self.dimensions, sort=False).sum()
+
+    def add(self, records: Any, keys: Optional[List[str]] = None) -> "ScoreCube":
+        """
+        Add evaluated records to the cube
+
+        Args:
+            records: A record, a list of records or a DataFrame
+            keys: Key of every record (e.g. its result store key), records
+                whose key was already added are skipped
+        """
+        if isinstance(records, dict):
+            records = [records]
+        df = records if isinstance(records, pd.DataFrame) else pd.DataFrame(list(records))
+        if keys is not None:
+            df = df[[key not in self.keys for key in keys]]
+            self.keys.update(keys)
+        if df.empty:
+            return self
+        partial = self._partial(df)
+        self._frame = None
+        for key, values in zip(partial.index, partial[self.statistics].to_numpy(dtype=float)):
+            key = key if isinstance(key, tuple) else (key,)
+            # Not in place, cells may be read-only views (e.g. loaded from Parquet)
+            self.cells[key] = self.cells[key] + values if key in self.cells else values.copy()
+        return self
+
+    def merge(self, other: "ScoreCube") -> "ScoreCube":
+        """Add the cells of another cube with the same dimensions and statistics"""
+        if other.dimensions != self.dimensions or other.statistics != self.statistics:
+            raise ValueError("Cubes with different dimensions or statistics cannot be merged")
+        self._frame = None
+        self.keys |= other.keys
+        for key, values in other.cells.items():
+            self.cells[key] = self.cells[key] + values if key in self.cells else values.copy()
+        return self
+
+    def frame(self) -> pd.DataFrame:
+        """Cells as a DataFrame indexed by the dimensions"""
+        if self._frame is None:
+            if self.cells:
+                index = pd.MultiIndex.from_tuples(list(self.cells), names=self.dimensions)
+                values = np.array(list(self.cells.values()))
+            else:
+                index = pd.MultiIndex.from_arrays([[] for _ in self.dimensions], names=self.dimensions)
+                values = np.empty((0, len(self.statistics)))
+            self._frame = pd.DataFrame(values, index=index, columns=self.statistics)
+        return self._frame
+
+    def query(
+        self,
+        by: Optional[Any] = None,
+        where: Optional[Dict[str, Any]] = None
+    ) -> pd.DataFrame:
+        """
+        Aggregates of the records grouped by some dimensions
+
+        Args:
+            by: Dimension(s) to group by (default: no grouping, a single "all" row)
+            where: Filters on dimensions, {dimension: value or list of values}
+
+        Returns:
+            DataFrame with the number of records, the count, mean and std of every
+            measure and the score histogram per group
+        """
+        cells = self.frame()
+        for dimension, value in (where or {}).items():
+            # Levels are stored as strings, e.g. {"recursion_limit": 10} matches "10"
+            missing = MISSING_LEVELS.get(dimension, "Unknown")
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            levels = cells.index.get_level_values(dimension)
+            cells = cells[levels.isin([_level(v, missing) for v in values])]
+        if by is None:
+            totals = cells.sum().to_frame("all").T
+        else:
+            totals = cells.groupby(level=[by] if isinstance(by, str) else list(by), sort=True).sum()
+
+        result = pd.DataFrame({"records": totals["records"].astype(np.int64)}, index=totals.index)
+        for measure in self.measures:
+            count = totals[f"{measure}_count"]
+            total = totals[f"{measure}_sum"]
+            mean = total / count.where(count > 0)
+            variance = (totals[f"{measure}_sum_sq"] - count * mean ** 2) / (count - 1).where(count > 1)
+            result[f"{measure}_count"] = count.astype(np.int64)
+            result[f"{measure}_mean"] = mean
+            result[f"{measure}_std"] = np.sqrt(variance.clip(lower=0))
+        for i in range(self.bins):
+            result[f"hist_{i}"] = totals[f"hist_{i}"].astype(np.int64)
+        return result
+
+    def save(self, path: str):
+        """Write the cells to a Parquet file, with the keys of the added records in its metadata"""
+        table = pa.Table.from_pandas(self.frame().reset_index(), preserve_index=False)
+        metadata = {**(table.schema.metadata or {}), KEYS_METADATA: json.dumps(sorted(self.keys)).encode("utf-8")}
+        pq.write_table(table.replace_schema_metadata(metadata), path)
+
+    @classmethod
+    def load(cls, path: str, score: str = "evaluation_score") -> "ScoreCube":
+        """Read a cube written by save"""
+        table = pq.read_table(path)
+        df = table.to_pandas()
+        measures = [column[:-len("_count")] for column in df.columns if column.endswith("_count")]
+        bins = sum(column.startswith("hist_") for column in df.columns)
+        cube = cls(measures=measures, score=score, bins=bins)
+        cube.dimensions = [column for column in df.columns if column not in cube.statistics]
+        values = df[cube.statistics].to_numpy(dtype=float)
+        for key, row in zip(df[cube.dimensions].itertuples(index=False, name=None), values):
+            cube.cells[key] = row.copy()
+        cube.keys = set(json.loads((table.schema.metadata or {}).get(KEYS_METADATA, b"[]")))
+        return cube
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __repr__(self):
+        return f"ScoreCube(dimensions={self.dimensions}, cells={len(self.cells)})"
@@ -0,0 +1,279 @@
+"""Sharded evaluation of a dataset with the MCP graph evaluator.
+
+Records are assigned to one of N shards by a hash of their question and
+database, so every machine computes the same split. Each shard runs in its
+own process with its own MCP servers and stores its results, as they are
+judged, in `shard-<iii>-of-<NNN>.jsonl` in the output directory, with
+zero-padded numbers (e.g. `shard-002-of-004.jsonl`); re-running a shard only
+evaluates the records still missing. The merge reads the shard outputs,
+keeps the results of the run configuration recorded in the shard manifests
+(shards run with different settings are not merged), removes duplicates,
+checks that every record of the dataset has a result and writes one result
+set in dataset order.
+
+    # all shards as local processes, then merge
+    python run_evaluation.py run --dataset ../../generate_eval_dataset/generated_dataset.json --num-shards 4
+
+    # a single shard, e.g. one per machine, sharing or copying the output directory
+    python run_evaluation.py run --dataset generated_dataset.json --num-shards 4 --shard 2
+
+    # merge the outputs of all shards
+    python run_evaluation.py merge --dataset generated_dataset.json --num-shards 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from typing import List, Tuple, Dict, Any, Optional
+
+import pandas as pd
+
+from prompts import evaluation_prompt
+from utils import (
+    MultiDatabaseMCPGraphEvaluator,
+    MCPServerPool,
+    EvaluationStore,
+    SnapshotMCPBackend,
+    custom_mcp_config,
+    record_id,
+    shard_index,
+    write_results,
+)
+
+
+def shard_name(shard: int, num_shards: int) -> str:
+    return f"shard-{shard:03d}-of-{num_shards:03d}"
+
+
+def load_dataset(path: str) -> pd.DataFrame:
+    """Dataset records with their record id, duplicated records removed"""
+    df = pd.read_json(path)
+    df["record_id"] = [record_id(record) for record in df.to_dict("records")]
+    return df.drop_duplicates("record_id").reset_index(drop=True)
+
+
+def shard_records(df: pd.DataFrame, shard: int, num_shards: int) -> pd.DataFrame:
+    mask = [shard_index(record, num_shards) == shard for record in df.to_dict("records")]
+    return df[mask].reset_index(drop=True)
+
+
+def run_config(args: argparse.Namespace) -> Dict[str, Any]:
+    """Settings that must be the same in every shard of a run"""
+    return {
+        "agent_model": args.agent_model,
+        "evaluation_model": args.evaluation_model,
+        "recursion_limit": args.recursion_limit,
+        "fast_path": args.fast_path,
+        "namespace": args.namespace,
+        "snapshot": os.path.basename(args.snapshot) if args.snapshot else None,
+    }
+
+
+def store_key(record: Dict[str, Any], config: Dict[str, Any]) -> str:
+    """Result store key of a record evaluated with a run config"""
+    return EvaluationStore.key(
+        record,
+        config["agent_model"],
+        custom_mcp_config(record["database"], config["namespace"]),
+        config["recursion_limit"],
+    )
+
+
+def read_manifest(output: str, name: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(output, f"{name}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(output: str, name: str, manifest: Dict[str, Any]):
+    with open(os.path.join(output, f"{name}.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+async def run_shard(args: argparse.Namespace, shard: int):
+    """Evaluate the records of one shard and write its manifest"""
+    df = shard_records(load_dataset(args.dataset), shard, args.num_shards)
+    name = shard_name(shard, args.num_shards)
+    config = run_config(args)
+    print(f"{name}: {len(df)} records")
+
+    os.makedirs(args.output, exist_ok=True)
+    # The output directory holds the results of one run configuration
+    previous = read_manifest(args.output, name)
+    if previous is not None and previous["config"] != config:
+        raise SystemExit(
+            f"{name}: {args.output} holds a run with other settings ({previous['config']}), "
+            f"use another --output"
+        )
+    manifest = {"shard": shard, "num_shards": args.num_shards, "records": len(df), "config": config}
+    # Written before evaluating, so an interrupted shard is resumed with the same settings
+    write_manifest(args.output, name, {**manifest, "completed": None, "errors": None})
+
+    result_store = EvaluationStore(os.path.join(args.output, f"{name}.jsonl"))
+    server_pool = MCPServerPool()
+    evaluator = MultiDatabaseMCPGraphEvaluator(
+        evaluation_prompt=evaluation_prompt,
+        namespace=args.namespace,
+        agent_model=args.agent_model,
+        evaluation_model=args.evaluation_model,
+        max_concurrent=args.max_concurrent,
+        recursion_limit=args.recursion_limit,
+        max_concurrent_total=args.max_concurrent_total,
+        server_pool=server_pool,
+        fast_path=args.fast_path,
+        judge_batch_size=args.judge_batch_size,
+        result_store=result_store,
+        backend=SnapshotMCPBackend(args.snapshot) if args.snapshot else None
+    )
+    try:
+        results = await evaluator.evaluate_dataset(df) if len(df) else []
+    finally:
+        await server_pool.close()
+        result_store.close()
+
+    errors = sum('error' in result for result in results)
+    manifest.update(completed=len(results) - errors, errors=errors)
+    write_manifest(args.output, name, manifest)
+    print(f"{name}: {manifest['completed']}/{len(df)} completed, {errors} errors")
+
+
+def launch_shards(args: argparse.Namespace) -> int:
+    """Run every shard in its own local process, return the number of failed processes"""
+    command = [sys.executable, os.path.abspath(__file__), *sys.argv[1:]]
+    processes = [
+        subprocess.Popen([*command, "--shard", str(shard)])
+        for shard in range(args.num_shards)
+    ]
+    return sum(process.wait() != 0 for process in processes)
+
+
+def merge_shards(
+    dataset: pd.DataFrame,
+    output: str,
+    num_shards: int
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Merge the stored results of all shards
+
+    Only the results stored under the key of the run configuration of the
+    shard manifests are kept, so results of earlier runs with other settings
+    in the same store are ignored. Results are deduplicated by record id,
+    keeping the one of the lowest shard, and ordered as the dataset, so the
+    merge does not depend on the order in which shards or records finished.
+
+    Raises:
+        ValueError: When shards were run with different settings
+
+    Returns:
+        Tuple of (merged records, report with the run config, missing shards
+        and records, duplicates, unexpected records and results of other configs)
+    """
+    names = [shard_name(shard, num_shards) for shard in range(num_shards)]
+    manifests = {name: read_manifest(output, name) for name in names}
+    configs = []
+    for manifest in manifests.values():
+        if manifest is not None and manifest["config"] not in configs:
+            configs.append(manifest["config"])
+    if len(configs) > 1:
+        raise ValueError(f"shards were run with different settings: {configs}")
+    config = configs[0] if configs else None
+
+    positions = {rid: position for position, rid in enumerate(dataset["record_id"])}
+    keys = {}
+    if config is not None:
+        keys = {store_key(record, config): record["record_id"] for record in dataset.to_dict("records")}
+    merged = {}
+    report = {"config": config, "missing_shards": [], "duplicates": 0, "unexpected": 0, "other_config": 0}
+
+    for shard, name in enumerate(names):
+        store_path = os.path.join(output, f"{name}.jsonl")
+        if manifests[name] is None or not os.path.exists(store_path):
+            report["missing_shards"].append(shard)
+            continue
+        with EvaluationStore(store_path) as store:
+            stored = sorted(store.results.items())
+        for key, record in stored:
+            rid = record.get("record_id") or record_id(record)
+            if rid not in positions:
+                report["unexpected"] += 1
+            elif keys.get(key) != rid:
+                report["other_config"] += 1
+            elif rid in merged:
+                report["duplicates"] += 1
+            else:
+                merged[rid] = record
+
+    report["missing_records"] = [rid for rid in dataset["record_id"] if rid not in merged]
+    report["complete"] = not report["missing_shards"] and not report["missing_records"]
+    records = sorted(merged.values(), key=lambda record: positions[record.get("record_id") or record_id(record)])
+    return records, report
+
+
+def merge(args: argparse.Namespace) -> bool:
+    """Merge the shard outputs into one Parquet result set, return whether it is complete"""
+    dataset = load_dataset(args.dataset)
+    try:
+        records, report = merge_shards(dataset, args.output, args.num_shards)
+    except ValueError as e:
+        raise SystemExit(f"Cannot merge {args.output}: {e}")
+    write_results(records, args.merged)
+
+    print(f"Merged {len(records)}/{len(dataset)} records into {args.merged}")
+    print(f"Duplicates removed: {report['duplicates']}, unexpected records: {report['unexpected']}, "
+          f"results of other settings ignored: {report['other_config']}")
+    if report["missing_shards"]:
+        print(f"Missing shards: {report['missing_shards']}")
+    if report["missing_records"]:
+        print(f"Records without result: {len(report['missing_records'])}, re-run their shards to resume")
+    return report["complete"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Evaluate one shard, or all shards as local processes")
+    run_parser.add_argument("--shard", type=int, help="Shard to evaluate (default: all, one process each)")
+    run_parser.add_argument("--agent-model", default="anthropic:claude-3-7-sonnet-latest")
+    run_parser.add_argument("--evaluation-model", default="openai:gpt-4o-mini")
+    run_parser.add_argument("--namespace", default="custom", help="Namespace of the MCP server tools")
+    run_parser.add_argument("--max-concurrent", type=int, default=5, help="Concurrent records per database")
+    run_parser.add_argument("--max-concurrent-total", type=int, help="Concurrent records per shard")
+    run_parser.add_argument("--recursion-limit", type=int, default=10)
+    run_parser.add_argument("--judge-batch-size", type=int, default=1)
+    run_parser.add_argument("--fast-path", action="store_true",
+                            help="Score unambiguous single-value answers without the LLM judge")
+    run_parser.add_argument("--snapshot", help="Graph snapshot served instead of the MCP servers")
+
+    merge_parser = subparsers.add_parser("merge", help="Merge the shard outputs")
+
+    for subparser in (run_parser, merge_parser):
+        subparser.add_argument("--dataset", required=True, help="Dataset JSON file")
+        subparser.add_argument("--num-shards", type=int, required=True)
+        subparser.add_argument("--output", default="shards", help="Directory of the shard outputs")
+        subparser.add_argument("--merged", default="eval_results.parquet", help="Merged result file")
+        subparser.add_argument("--allow-incomplete", action="store_true",
+                               help="Exit with 0 even when records are missing")
+
+    args = parser.parse_args()
+    if args.command == "run" and args.shard is not None and not 0 <= args.shard < args.num_shards:
+        parser.error(f"--shard must be between 0 and {args.num_shards - 1}")
+
+    if args.command == "run":
+        if args.shard is not None:
+            asyncio.run(run_shard(args, args.shard))
+            return
+        failed = launch_shards(args)
+        if failed:
+            print(f"{failed} shard processes failed")
+    complete = merge(args)
+    if not complete and not args.allow_incomplete:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+import numpy as np
+import pandas as pd
+from typing import Tuple, Any, Optional, Sequence
+
+# Dimensions evaluation results are sliced by
+SLICES = ("database", "complexity", "query_type", "noise_type")
+
+# Largest resamples x values matrix drawn at once
+MAX_MATRIX_SIZE = 2 ** 24
+
+# Records per distinct value below which records are drawn directly instead
+# of drawing the counts of distinct values
+INDEX_DRAW_RATIO = 25
+
+
+def _distinct(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Scores take few distinct values, resampling their counts is exact and
+    # independent of the number of records
+    return np.unique(values, return_counts=True)
+
+
+def bootstrap_means(
+    values: Any,
+    n_resamples: int = 2000,
+    rng: Optional[np.random.Generator] = None
+) -> np.ndarray:
+    """
+    Means of bootstrap resamples of values
+
+    A resample draws every distinct value as many times as a multinomial draw
+    over their frequencies, which has the same distribution as drawing the
+    records with replacement, so the cost of large slices does not depend on
+    the number of records. All resamples are one matrix operation.
+
+    Args:
+        values: 1-D array of values (without NaN)
+        n_resamples: Number of resamples
+        rng: Random generator (default: seeded with 0)
+
+    Returns:
+        Array of n_resamples means
+    """
+    rng = rng if rng is not None else np.random.default_rng(0)
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if n == 0:
+        return np.full(n_resamples, np.nan)
+    distinct, counts = _distinct(values)
+    # Drawing record indices is cheaper for small slices
+    by_index = n <= INDEX_DRAW_RATIO * len(distinct)
+    chunk = max(1, MAX_MATRIX_SIZE // (n if by_index else len(distinct)))
+    means = np.empty(n_resamples)
+    for start in range(0, n_resamples, chunk):
+        size = min(chunk, n_resamples - start)
+        if by_index:
+            means[start:start + size] = values[rng.integers(0, n, size=(size, n))].mean(axis=1)
+        else:
+            draws = rng.multinomial(n, counts / n, size=size)
+            means[start:start + size] = draws @ distinct / n
+    return means
+
+
+def bootstrap_ci(
+    values: Any,
+    n_resamples: int = 2000,
+    confidence: float = 0.95,
+    seed: int = 0
+) -> Tuple[float, float, float]:
+    """
+    Mean of values and its percentile bootstrap confidence interval
+
+    Args:
+        values: Values, NaN are ignored
+        n_resamples: Number of bootstrap resamples
+        confidence: Confidence level of the interval
+        seed: Seed of the random generator
+
+    Returns:
+        Tuple of (mean, lower bound, upper bound)
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return (np.nan, np.nan, np.nan)
+    means = bootstrap_means(values, n_resamples, np.random.default_rng(seed))
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(means, [alpha, 1 - alpha])
+    return (float(values.mean()), float(low), float(high))
+
+
+def permutation_test(
+    differences: Any,
+    n_resamples: int = 2000,
+    seed: int = 0
+) -> float:
+    """
+    Two-sided paired permutation (sign-flip) test of a zero mean difference
+
+    Under the null hypothesis each paired difference is as likely to have
+    either sign. Flipping the signs of the c copies of a distinct difference
+    d adds d * (2 * Binomial(c, 1/2) - c) to the sum, so for large slices
+    all permutations are drawn per distinct value in one matrix operation.
+
+    Args:
+        differences: Paired differences, NaN are ignored
+        n_resamples: Number of random sign flips
+        seed: Seed of the random generator
+
+    Returns:
+        p-value
+    """
+    differences = np.asarray(differences, dtype=float)
+    differences = differences[~np.isnan(differences)]
+    if len(differences) == 0:
+        return np.nan
+    rng = np.random.default_rng(seed)
+    # Zero differences do not change the sum whatever their sign
+    nonzero = differences[differences != 0]
+    if len(nonzero) == 0:
+        return 1.0
+    distinct, counts = _distinct(nonzero)
+    observed = abs(differences.sum())
+    by_index = len(nonzero) <= INDEX_DRAW_RATIO * len(distinct)
+    chunk = max(1, MAX_MATRIX_SIZE // (len(nonzero) if by_index else len(distinct)))
+    extreme = 0
+    for start in range(0, n_resamples, chunk):
+        size = min(chunk, n_resamples - start)
+        if by_index:
+            signs = 2 * rng.integers(0, 2, size=(size, len(nonzero)), dtype=np.int8) - 1
+            sums = signs @ nonzero
+        else:
+            positives = rng.binomial(counts, 0.5, size=(size, len(distinct)))
+            sums = (2 * positives - counts) @ distinct
+        extreme += int(np.count_nonzero(np.abs(sums) >= observed - 1e-9))
+    return (extreme + 1) / (n_resamples + 1)
+
+
+def _slices(df: pd.DataFrame, by: Optional[Sequence[str]]):
+    """(slice, level, row positions) of the whole frame and of every level of every slice column"""
+    yield "all", "all", np.arange(len(df))
+    for column in by or []:
+        if column not in df.columns:
+            continue
+        levels = df[column].fillna("Unknown").astype(str)
+        for level, positions in sorted(levels.groupby(levels).indices.items()):
+            yield column, level, positions
+
+
+def score_intervals(
+    records: Any,
+    by: Optional[Sequence[str]] = SLICES,
+    value: str = "evaluation_score",
+    n_resamples: int = 2000,
+    confidence: float = 0.95,
+    seed: int = 0
+) -> pd.DataFrame:
+    """
+    Mean score with bootstrap confidence interval, overall and per slice
+
+    Args:
+        records: Evaluated records (list of dicts or DataFrame)
+        by: Columns to slice by (default: SLICES present in records)
+        value: Score column
+        n_resamples: Number of bootstrap resamples
+        confidence: Confidence level of the intervals
+        seed: Seed of the random generator
+
+    Returns:
+        DataFrame indexed by (slice, level) with n, mean, ci_low and ci_high
+    """
+    df = records if isinstance(records, pd.DataFrame) else pd.DataFrame(list(records))
+    df = df[pd.to_numeric(df[value], errors="coerce").notna()]
+    values = pd.to_numeric(df[value]).to_numpy(dtype=float)
+    rows = []
+    for column, level, positions in _slices(df, by):
+        mean, low, high = bootstrap_ci(values[positions], n_resamples, confidence, seed)
+        rows.append({"slice": column, "level": level, "n": len(positions),
+                     "mean": mean, "ci_low": low, "ci_high": high})
+    return pd.DataFrame(rows).set_index(["slice", "level"])
+
+
+def paired_scores(
+    a: Any,
+    b: Any,
+    key: Sequence[str] = ("question", "database"),
+    value: str = "evaluation_score",
+    by: Optional[Sequence[str]] = SLICES
+) -> pd.DataFrame:
+    """
+    Scores of the records evaluated in both runs, paired by key
+
+    Returns:
+        DataFrame with the key and `by` columns of run a, `score_a`, `score_b` and `difference`
+    """
+    key = list(key)
+    a = a if isinstance(a, pd.DataFrame) else pd.DataFrame(list(a))
+    b = b if isinstance(b, pd.DataFrame) else pd.DataFrame(list(b))
+    slices = [column for column in by or [] if column in a.columns and column not in key]
+    left = a[[*key, *slices, value]].drop_duplicates(key).rename(columns={value: "score_a"})
+    right = b[[*key, value]].drop_duplicates(key).rename(columns={value: "score_b"})
+    pairs = left.merge(right, on=key, how="inner")
+    pairs["score_a"] = pd.to_numeric(pairs["score_a"], errors="coerce")
+    pairs["score_b"] = pd.to_numeric(pairs["score_b"], errors="coerce")
+    pairs = pairs.dropna(subset=["score_a", "score_b"])
+    pairs["difference"] = pairs["score_a"] - pairs["score_b"]
+    return pairs
+
+
+def compare_runs(
+    a: Any,
+    b: Any,
+    by: Optional[Sequence[str]] = SLICES,
+    key: Sequence[str] = ("question", "database"),
+    value: str = "evaluation_score",
+    n_resamples: int = 2000,
+    confidence: float = 0.95,
+    seed: int = 0
+) -> pd.DataFrame:
+    """
+    Paired comparison of two evaluation runs, overall and per slice
+
+    Records are paired by key. For each slice the mean difference (a - b) gets
+    a bootstrap confidence interval and the p-value of a paired permutation
+    test, so that differences within run-to-run noise can be told apart from
+    real ones.
+
+    Args:
+        a: Evaluated records of the first run (list of dicts or DataFrame)
+        b: Evaluated records of the second run
+        by: Columns to slice by (default: SLICES present in records)
+        key: Columns identifying a record in both runs
+        value: Score column
+        n_resamples: Number of bootstrap resamples and permutations
+        confidence: Confidence level of the intervals
+        seed: Seed of the random generator
+
+    Returns:
+        DataFrame indexed by (slice, level) with n_pairs, mean_a, mean_b,
+        difference, ci_low, ci_high and p_value
+    """
+    pairs = paired_scores(a, b, key, value, by)
+    scores_a, scores_b = pairs["score_a"].to_numpy(), pairs["score_b"].to_numpy()
+    rows = []
+    for column, level, positions in _slices(pairs, by):
+        differences = scores_a[positions] - scores_b[positions]
+        difference, low, high = bootstrap_ci(differences, n_resamples, confidence, seed)
+        rows.append({
+            "slice": column,
+            "level": level,
+            "n_pairs": len(positions),
+            "mean_a": scores_a[positions].mean(),
+            "mean_b": scores_b[positions].mean(),
+            "difference": difference,
+            "ci_low": low,
+            "ci_high": high,
+            "p_value": permutation_test(differences, n_resamples, seed),
+        })
+    return pd.DataFrame(rows).set_index(["slice", "level"])
@@ -0,0 +1,1802 @@
+import os
+import re
+import ast
+import json
+import math
+import time
+import asyncio
+import hashlib
+import random
+import statistics
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import List, Tuple, Dict, Any, Optional, Sequence
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import load_mcp_tools
+from langgraph.prebuilt import create_react_agent
+from langchain.chat_models import init_chat_model
+from langchain.schema import AIMessage
+from langchain_core.tools import StructuredTool, ToolException
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from cube import ScoreCube
+from stats import bootstrap_ci
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Return True for rate-limit and overload errors raised by LLM clients."""
+    status = getattr(error, "status_code", None)
+    response = getattr(error, "response", None)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None)
+    if status in (429, 503, 529):
+        return True
+    name = type(error).__name__
+    return any(marker in name for marker in ("RateLimit", "Overloaded", "ResourceExhausted"))
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Return the Retry-After delay of an error response, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    """Adaptive (AIMD) concurrency limiter for LLM calls.
+
+    The concurrency limit grows additively while requests succeed (about one
+    extra slot per `limit` successes) and is cut multiplicatively on
+    rate-limit or overload errors, at most once per window of in-flight
+    requests. After such an error no new request starts before the
+    Retry-After delay (or an exponential backoff) has passed.
+
+    Use `async with limiter:` as a drop-in replacement for a semaphore, or
+    `await limiter.run(func, *args)` to also retry rate-limited calls.
+
+    Args:
+        initial: Initial concurrency limit
+        min_limit: Lower bound of the limit
+        max_limit: Upper bound of the limit
+        decrease_factor: Factor applied to the limit on rate-limit errors
+        max_retries: Retries of a rate-limited call in `run`
+        base_delay: Backoff in seconds when the error has no Retry-After
+    """
+
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 64,
+                 decrease_factor: float = 0.5, max_retries: int = 5, base_delay: float = 1.0):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.in_flight = 0
+        self.rate_limited = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._condition = None
+        self._started = {}
+
+    def _get_condition(self) -> asyncio.Condition:
+        # Created lazily so that the limiter can be built outside an event loop
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self) -> float:
+        """Wait for a free slot and return the time the request started."""
+        condition = self._get_condition()
+        async with condition:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    try:
+                        await asyncio.wait_for(condition.wait(), pause)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                if self.in_flight < int(self.limit):
+                    break
+                await condition.wait()
+            self.in_flight += 1
+        return time.monotonic()
+
+    async def release(self, started: float, error: Optional[Exception] = None,
+                      attempt: int = 0):
+        """Free a slot and adapt the limit to the outcome of the request."""
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            if error is not None and is_rate_limit_error(error):
+                self.rate_limited += 1
+                # Requests started before the last decrease saw the old limit
+                if started >= self._last_decrease:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._last_decrease = time.monotonic()
+                delay = retry_after_seconds(error)
+                if delay is None:
+                    delay = self.base_delay * 2 ** attempt
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            elif error is None:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            condition.notify_all()
+
+    async def run(self, func, *args, **kwargs):
+        """Call `await func(*args, **kwargs)` within the limit, retrying rate-limited calls."""
+        for attempt in range(self.max_retries + 1):
+            started = await self.acquire()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                await self.release(started, e, attempt)
+                if is_rate_limit_error(e) and attempt < self.max_retries:
+                    continue
+                raise
+            await self.release(started)
+            return result
+
+    async def __aenter__(self):
+        self._started[asyncio.current_task()] = await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        started = self._started.pop(asyncio.current_task())
+        await self.release(started, exc)
+
+    def __repr__(self):
+        return (
+            f"AdaptiveLimiter(limit={self.limit:.1f}, in_flight={self.in_flight}, "
+            f"rate_limited={self.rate_limited})"
+        )
+
+
+def server_config_key(mcp_config: Dict[str, Any]) -> str:
+    """Return a short stable key identifying an MCP server config."""
+    payload = json.dumps(mcp_config, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+
+class _PooledServer:
+    """Persistent sessions of one MCP config, owned by a single background task."""
+
+    def __init__(self, mcp_config: Dict[str, Any]):
+        self.mcp_config = mcp_config
+        self.sessions = {}
+        self.tools = []
+        self.error = None
+        self.startup_time = None
+        self.tool_calls = []
+        self.ready = asyncio.Event()
+        self.closing = asyncio.Event()
+        self.task = None
+
+
+class MCPServerPool:
+    """Pool of warm MCP server processes keyed by server config.
+
+    `MultiServerMCPClient.get_tools()` opens a new stdio session, and so a new
+    `uvx` process, for every tool call. The pool instead keeps one persistent
+    session per server config for the lifetime of the process, so evaluators
+    created in later runs reuse already started servers. Sessions are pinged
+    before reuse and restarted when the ping fails.
+
+    Startup time and the latency of every tool call are recorded; `report()`
+    compares cold start, first call and warm call latencies per config.
+
+    Args:
+        ping_timeout: Seconds to wait for a health-check ping
+    """
+
+    def __init__(self, ping_timeout: float = 5.0):
+        self.ping_timeout = ping_timeout
+        self.servers = {}
+        self.restarts = defaultdict(int)
+        self._locks = {}
+
+    async def _serve(self, server: _PooledServer):
+        # Sessions are entered and exited in this task, as required by the
+        # anyio cancel scopes of the stdio transport
+        started = time.perf_counter()
+        try:
+            client = MultiServerMCPClient(server.mcp_config)
+            async with AsyncExitStack() as stack:
+                for name in server.mcp_config:
+                    session = await stack.enter_async_context(client.session(name))
+                    server.sessions[name] = session
+                    tools = await load_mcp_tools(session)
+                    server.tools.extend(self._timed_tool(server, tool) for tool in tools)
+                server.startup_time = time.perf_counter() - started
+                server.ready.set()
+                await server.closing.wait()
+        except Exception as e:
+            server.error = e
+        finally:
+            server.ready.set()
+
+    @staticmethod
+    def _timed_tool(server: _PooledServer, tool):
+        """Record the latency of every call of a pooled tool."""
+        coroutine = tool.coroutine
+
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await coroutine(*args, **kwargs)
+            finally:
+                server.tool_calls.append((tool.name, time.perf_counter() - started))
+
+        tool.coroutine = timed
+        return tool
+
+    async def _start(self, key: str, mcp_config: Dict[str, Any]) -> _PooledServer:
+        server = _PooledServer(mcp_config)
+        server.task = asyncio.create_task(self._serve(server))
+        await server.ready.wait()
+        if server.error is not None:
+            raise RuntimeError(f"MCP server {key} failed to start: {server.error}") from server.error
+        self.servers[key] = server
+        return server
+
+    async def health_check(self, key: str) -> bool:
+        """Ping every session of a pooled server."""
+        server = self.servers.get(key)
+        if server is None or server.task.done():
+            return False
+        try:
+            for session in server.sessions.values():
+                await asyncio.wait_for(session.send_ping(), self.ping_timeout)
+        except Exception:
+            return False
+        return True
+
+    async def get_tools(self, mcp_config: Dict[str, Any]) -> List[Any]:
+        """Return tools bound to a warm server for this config, starting it if needed."""
+        key = server_config_key(mcp_config)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            if key in self.servers:
+                if await self.health_check(key):
+                    return self.servers[key].tools
+                await self._stop(key)
+                self.restarts[key] += 1
+            server = await self._start(key, mcp_config)
+            return server.tools
+
+    async def warm(self, mcp_configs: List[Dict[str, Any]]) -> pd.DataFrame:
+        """Start servers for all configs concurrently and return the startup report."""
+        await asyncio.gather(*[self.get_tools(config) for config in mcp_configs])
+        return self.report()
+
+    async def _stop(self, key: str):
+        server = self.servers.pop(key, None)
+        if server is not None:
+            server.closing.set()
+            await asyncio.gather(server.task, return_exceptions=True)
+
+    async def close(self):
+        """Stop all pooled servers."""
+        await asyncio.gather(*[self._stop(key) for key in list(self.servers)])
+
+    def report(self) -> pd.DataFrame:
+        """Cold start and tool-call latencies (in seconds) per pooled server."""
+        rows = []
+        for key, server in self.servers.items():
+            latencies = [latency for _, latency in server.tool_calls]
+            env = next(iter(server.mcp_config.values()), {}).get("env", {})
+            rows.append({
+                "server": key,
+                "database": env.get("NEO4J_DATABASE"),
+                "startup_time": server.startup_time,
+                "restarts": self.restarts[key],
+                "tool_calls": len(latencies),
+                "first_call_time": latencies[0] if latencies else None,
+                "warm_call_median": statistics.median(latencies[1:]) if len(latencies) > 1 else None,
+            })
+        return pd.DataFrame(rows)
+
+    def __repr__(self):
+        return f"MCPServerPool(servers={len(self.servers)})"
+
+
+def _normalize_arguments(value: Any) -> Any:
+    """Normalize tool arguments so that whitespace differences do not cause misses."""
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {key: _normalize_arguments(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize_arguments(item) for item in value]
+    return value
+
+
+def _to_jsonable(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if isinstance(value, (list, tuple)):
+        return [_to_jsonable(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _to_jsonable(item) for key, item in value.items()}
+    return value
+
+
+class ToolTrace:
+    """Record and replay MCP tool calls through a local JSONL trace.
+
+    In "record" mode, tools are wrapped so that the name, arguments and
+    response (or error) of every call are appended to the trace, together
+    with the tool definitions of each server. In "replay" mode, tools are
+    rebuilt from the recorded definitions and answer from the trace by exact
+    match on the normalized arguments, without any MCP server or database.
+    Calls missing from the trace raise a ToolException and are collected in
+    `misses`.
+
+    Calls are scoped by server config (which includes the database), so one
+    trace can hold several databases and server variants.
+
+    Args:
+        path: Trace file
+        mode: "record" or "replay"
+    """
+
+    def __init__(self, path: str = "tool_trace.jsonl", mode: str = "record"):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown tool trace mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.responses = {}
+        self.definitions = {}
+        self.misses = []
+        self.hits = 0
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if "tools" in entry:
+                        self.definitions[entry["scope"]] = entry["tools"]
+                    else:
+                        self.responses[entry["key"]] = entry
+        elif mode == "replay":
+            raise FileNotFoundError(f"Tool trace not found: {path}")
+        self._file = open(path, "a", encoding="utf-8") if mode == "record" else None
+
+    @staticmethod
+    def call_key(scope: str, tool_name: str, arguments: Dict[str, Any]) -> str:
+        payload = json.dumps(
+            [scope, tool_name, _normalize_arguments(arguments)], sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def _write(self, entry: Dict[str, Any]):
+        self._file.write(json.dumps(entry, default=str) + "\n")
+        self._file.flush()
+
+    def wrap_tools(self, tools: List[Any], mcp_config: Dict[str, Any]) -> List[Any]:
+        """Record the calls of tools loaded from the MCP server(s) of a config"""
+        scope = server_config_key(mcp_config)
+        definitions = [
+            {
+                "name": tool.name,
+                "description": tool.description,
+                "args_schema": (
+                    tool.args_schema if isinstance(tool.args_schema, dict)
+                    else tool.args_schema.model_json_schema()
+                ),
+                "response_format": getattr(tool, "response_format", "content"),
+            }
+            for tool in tools
+        ]
+        if self.definitions.get(scope) != definitions:
+            self._write({"scope": scope, "tools": definitions})
+            self.definitions[scope] = definitions
+        return [self._recording_tool(tool, scope) for tool in tools]
+
+    def _recording_tool(self, tool, scope: str):
+        coroutine = tool.coroutine
+
+        async def recorded(**kwargs):
+            entry = {
+                "key": self.call_key(scope, tool.name, kwargs),
+                "scope": scope,
+                "tool": tool.name,
+                "arguments": kwargs,
+            }
+            try:
+                response = await coroutine(**kwargs)
+            except Exception as e:
+                entry["error"] = str(e)
+                self._write(entry)
+                self.responses[entry["key"]] = entry
+                raise
+            entry["response"] = _to_jsonable(response)
+            entry["is_tuple"] = isinstance(response, tuple)
+            self._write(entry)
+            self.responses[entry["key"]] = entry
+            return response
+
+        # Copies, as tools may be shared through an MCPServerPool
+        return tool.model_copy(update={"coroutine": recorded})
+
+    def replay_tools(self, mcp_config: Dict[str, Any]) -> List[Any]:
+        """Tools of a config answering from the trace only"""
+        scope = server_config_key(mcp_config)
+        if scope not in self.definitions:
+            raise KeyError(f"No recorded tools for MCP config {scope}")
+        return [
+            StructuredTool(
+                name=definition["name"],
+                description=definition["description"] or "",
+                args_schema=definition["args_schema"],
+                coroutine=self._replaying_coroutine(definition["name"], scope),
+                response_format=definition["response_format"],
+            )
+            for definition in self.definitions[scope]
+        ]
+
+    def _replaying_coroutine(self, tool_name: str, scope: str):
+        async def replayed(**kwargs):
+            entry = self.responses.get(self.call_key(scope, tool_name, kwargs))
+            if entry is None:
+                self.misses.append({"scope": scope, "tool": tool_name, "arguments": kwargs})
+                raise ToolException(f"No recorded response for {tool_name} with these arguments")
+            self.hits += 1
+            if "error" in entry:
+                raise ToolException(entry["error"])
+            return tuple(entry["response"]) if entry["is_tuple"] else entry["response"]
+
+        return replayed
+
+    def miss_report(self) -> pd.DataFrame:
+        """Replayed calls that were not found in the trace"""
+        return pd.DataFrame(self.misses, columns=["scope", "tool", "arguments"])
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+    def __repr__(self):
+        return (
+            f"ToolTrace(mode={self.mode!r}, recorded={len(self.responses)}, "
+            f"hits={self.hits}, misses={len(self.misses)})"
+        )
+
+
+def _snapshot_query_key(query: str, params: Optional[Dict[str, Any]] = None) -> str:
+    # Same keys as GraphSnapshot in generate_eval_dataset/utils.py
+    text = " ".join(query.split()).rstrip(";")
+    return json.dumps([text, params or {}], sort_keys=True, default=str)
+
+
+class SnapshotMCPBackend:
+    """Local stand-in for the mcp-neo4j-cypher server answering from a graph snapshot.
+
+    The snapshot is the JSON file written by `GraphSnapshot` in
+    generate_eval_dataset/utils.py. `tools()` returns the
+    `get_neo4j_schema` and `read_neo4j_cypher` tools (with the namespace of
+    the MCP config) for the database of the config: the schema tool returns
+    the recorded structured schema and the read tool the recorded rows of a
+    query. Unknown queries return an empty result and are collected in
+    `misses`. An optional `latency` in seconds is added to every tool call.
+
+    Args:
+        path: Snapshot file
+        latency: Simulated round-trip time of a tool call
+    """
+
+    def __init__(self, path: str = "graph_snapshot.json", latency: float = 0.0):
+        with open(path, encoding="utf-8") as f:
+            self.databases = json.load(f)["databases"]
+        self.latency = latency
+        self.misses = []
+
+    def tools(self, mcp_config: Dict[str, Any]) -> List[Any]:
+        """Tools of the (single) server of an MCP config"""
+        server = next(iter(mcp_config.values()))
+        args = server.get("args", [])
+        namespace = args[args.index("--namespace") + 1] if "--namespace" in args else None
+        prefix = f"{namespace}-" if namespace else ""
+        database = server.get("env", {}).get("NEO4J_DATABASE", "neo4j")
+        if database not in self.databases:
+            raise KeyError(f"Database {database} is not in the snapshot")
+        data = self.databases[database]
+
+        async def get_neo4j_schema():
+            await asyncio.sleep(self.latency)
+            return json.dumps(data["structured_schema"], default=str)
+
+        async def read_neo4j_cypher(query: str, params: Optional[Dict[str, Any]] = None):
+            await asyncio.sleep(self.latency)
+            key = _snapshot_query_key(query, params)
+            if key not in data["queries"]:
+                self.misses.append({"database": database, "query": query, "params": params})
+                return "[]"
+            return json.dumps(data["queries"][key], default=str)
+
+        return [
+            StructuredTool(
+                name=f"{prefix}get_neo4j_schema",
+                description="List all node types, their attributes and their relationships to other node types in the neo4j database.",
+                args_schema={"type": "object", "properties": {}},
+                coroutine=get_neo4j_schema,
+            ),
+            StructuredTool(
+                name=f"{prefix}read_neo4j_cypher",
+                description="Execute a Cypher query on the neo4j database.",
+                args_schema={
+                    "type": "object",
+                    "properties": {
+                        "query": {"type": "string", "description": "The Cypher query to execute."},
+                        "params": {"type": "object", "description": "The parameters to pass to the Cypher query."},
+                    },
+                    "required": ["query"],
+                },
+                coroutine=read_neo4j_cypher,
+            ),
+        ]
+
+    def __repr__(self):
+        return f"SnapshotMCPBackend(databases={len(self.databases)}, misses={len(self.misses)})"
+
+
+NUMBER_SCALES = {
+    "thousand": 1e3, "k": 1e3,
+    "million": 1e6, "mn": 1e6, "m": 1e6,
+    "billion": 1e9, "bn": 1e9, "b": 1e9,
+    "trillion": 1e12, "tn": 1e12, "t": 1e12,
+}
+
+_number_pattern = re.compile(
+    r"(?<![\w.-])(-?\d[\d,]*(?:\.\d+)?)\s*(%|percent\b|thousand\b|million\b|billion\b|trillion\b|mn\b|bn\b|tn\b|[kmbt]\b)?",
+    re.IGNORECASE,
+)
+
+# Numbered or bulleted list items, an answer listing several candidates
+_list_pattern = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s+", re.MULTILINE)
+
+# Negations, alternatives and hedges, an answer that does not simply state a value
+_hedge_pattern = re.compile(
+    r"\b(?:not|no|none|never|neither|nor|cannot|unable|unclear|unknown|either|or|between|"
+    r"might|may|maybe|perhaps|possibly|probably|likely|appears?|seems?)\b|n't\b",
+    re.IGNORECASE,
+)
+
+# Words of an answer
+_word_pattern = re.compile(r"[^\W\d_]+")
+
+# Words that phrase an answer without claiming anything, any other word of
+# the answer that is not a word of the question is a further claim
+FILLER_WORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "been", "has", "have", "had", "of", "in", "on",
+    "at", "to", "for", "from", "with", "by", "as", "and", "it", "its", "this", "that", "these", "there",
+    "their", "which", "who", "whose", "what", "i", "we", "you", "can", "see", "tell", "here", "so",
+    "total", "totals", "value", "answer", "result", "results", "query", "queries", "database", "data",
+    "neo", "j", "graph", "based", "according", "found", "find", "information", "shows", "show",
+    "exactly", "approximately", "about", "around", "roughly", "precisely", "s", "usd", "dollars",
+}
+
+
+def extract_numbers(text: str) -> List[List[Tuple[float, bool]]]:
+    """Extract the numbers mentioned in text.
+
+    Every mention is a list of its (value, rounded) readings: the scaled value
+    for scale words ("198.27 billion", "5M"), which is rounded, the written
+    value and the fraction for percentages, the written value otherwise.
+    Thousands separators are removed; numbers that are part of a word or
+    identifier ("DC1", "RCK-4") are not mentions.
+    """
+    mentions = []
+    for match in _number_pattern.finditer(text):
+        digits, suffix = match.group(1).replace(",", ""), (match.group(2) or "").lower()
+        try:
+            value = float(digits)
+        except ValueError:
+            continue
+        if suffix in NUMBER_SCALES:
+            readings = [(value * NUMBER_SCALES[suffix], True)]
+        elif suffix in ("%", "percent"):
+            readings = [(value, False), (value / 100, True)]
+        else:
+            readings = [(value, False)]
+        mentions.append(readings)
+    return mentions
+
+
+def _normalize_text(text: str) -> str:
+    text = text.casefold().replace("’", "'").replace("‘", "'")
+    text = re.sub(r"[\"“”`*_]", " ", text)
+    return " ".join(text.split())
+
+
+def _number_matches(expected: float, readings: List[Tuple[float, bool]], rel_tol: float) -> bool:
+    # Whole references (counts, ids, years) must be stated exactly unless the
+    # answer rounds them with a scale word, fractional ones may be rounded
+    exact = float(expected).is_integer()
+    for value, rounded in readings:
+        tolerance = rel_tol * abs(expected) if rounded or not exact else 0.0
+        if abs(value - expected) <= tolerance + 1e-9 * abs(expected):
+            return True
+    return False
+
+
+def _stem(word: str) -> str:
+    word = word.casefold()
+    return word[:-1] if len(word) > 3 and word.endswith("s") else word
+
+
+def _extra_words(answer: str, expected: str, question: str) -> List[str]:
+    """Words of the answer besides the expected value, its numbers, the words of the question and filler"""
+    text = _normalize_text(answer)
+    expected = _normalize_text(expected).strip(" .")
+    if expected:
+        text = re.sub(rf"(?<!\w){re.escape(expected)}(?!\w)", " ", text)
+    text = _number_pattern.sub(" ", text)
+    known = FILLER_WORDS | {_stem(word) for word in _word_pattern.findall(question)}
+    return [word for word in _word_pattern.findall(text) if _stem(word) not in known and word not in known]
+
+
+def _text_in_answer(expected: str, answer: str) -> bool:
+    expected = _normalize_text(expected).strip(" .")
+    if not expected:
+        return False
+    return re.search(rf"(?<!\w){re.escape(expected)}(?!\w)", _normalize_text(answer)) is not None
+
+
+def fast_path_score(
+    result: Any,
+    generated_answer: str,
+    question: str = "",
+    rel_tol: float = 0.005
+) -> Optional[Tuple[float, str]]:
+    """
+    Deterministically score a generated answer against a single-value query result
+
+    Returns (score, reasoning) when the verdict is certain: 1.0 when the expected
+    value is the only claim of the answer, 0.0 for an empty answer. The expected
+    number must be the only number mentioned (besides the numbers of the
+    question), within rel_tol when the reference is fractional or the answer
+    rounds it with a scale word, exactly otherwise; expected text must appear
+    and no number may be mentioned besides it. Besides the value, the answer
+    may only use words of the question and filler (FILLER_WORDS), so any other
+    name or statement is left to the judge. Lists, negations, alternatives and
+    hedges, results with several values and everything else return None and
+    are left to the LLM judge.
+
+    Args:
+        result: Ground-truth query result, e.g. [{'company_revenue': 198270000000.0}]
+        generated_answer: Final answer of the agent
+        question: Question of the record, its numbers are not claims of the answer
+        rel_tol: Relative tolerance of rounded numbers
+    """
+    if not generated_answer or not generated_answer.strip():
+        return 0.0, "Fast path: the agent returned no answer."
+    if not isinstance(result, list) or len(result) != 1 or not isinstance(result[0], dict) or len(result[0]) != 1:
+        return None
+    expected = next(iter(result[0].values()))
+    if isinstance(expected, bool) or not isinstance(expected, (int, float, str)):
+        return None
+
+    answer = generated_answer.replace("’", "'")
+    if _list_pattern.search(answer) or _hedge_pattern.search(answer):
+        return None
+    ignored = {value for mention in extract_numbers(question) for value, _ in mention}
+    if isinstance(expected, str):
+        ignored |= {value for mention in extract_numbers(expected) for value, _ in mention}
+    if _extra_words(answer, expected if isinstance(expected, str) else "", question):
+        return None
+    mentions = [mention for mention in extract_numbers(answer) if mention[0][0] not in ignored]
+
+    if isinstance(expected, str):
+        if mentions or not _text_in_answer(expected, answer):
+            return None
+    elif not mentions or not all(_number_matches(float(expected), mention, rel_tol) for mention in mentions):
+        return None
+
+    return 1.0, f"Fast path: the expected value {expected!r} is the only claim of the generated answer."
+
+
+def _json_default(value):
+    # numpy scalars coming from DataFrame rows
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def question_hash(question: str) -> str:
+    return hashlib.sha256(question.encode("utf-8")).hexdigest()[:12]
+
+
+def record_id(record: Dict[str, Any]) -> str:
+    """Stable id of a dataset record, from its question and database"""
+    payload = f"{record['question']}\0{record.get('database')}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def shard_index(record: Dict[str, Any], num_shards: int) -> int:
+    """Shard of a dataset record, the same on every machine and run"""
+    return int(record_id(record), 16) % num_shards
+
+
+class EvaluationStore:
+    """Resumable JSONL store of evaluation results.
+
+    Results are keyed by (question hash, database, agent model, server config,
+    recursion_limit) and appended, one line each, as soon as a record has been
+    judged. Evaluators skip records whose key is already stored, so an
+    interrupted run resumes where it stopped and re-running a notebook only
+    evaluates new combinations. Failed records are not stored and are retried.
+    """
+
+    def __init__(self, path: str = "evaluation_results.jsonl"):
+        self.path = path
+        self.results = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Truncated trailing line left by an interrupted run
+                        continue
+                    self.results[entry.pop("_key")] = entry
+        self._file = open(path, "a", encoding="utf-8")
+
+    @staticmethod
+    def key(record: Dict[str, Any], agent_model: Any, mcp_config: Dict[str, Any], recursion_limit: int) -> str:
+        """Key of a record evaluated with a given configuration"""
+        config = {
+            "question": question_hash(record["question"]),
+            "database": record.get("database"),
+            "agent_model": str(agent_model),
+            "server": server_config_key(mcp_config),
+            "recursion_limit": recursion_limit,
+        }
+        return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        result = self.results.get(key)
+        return dict(result) if result is not None else None
+
+    def put(self, key: str, record: Dict[str, Any]):
+        entry = {"_key": key, **record}
+        self._file.write(json.dumps(entry, default=_json_default) + "\n")
+        self._file.flush()
+        self.results[key] = dict(record)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame(list(self.results.values()))
+
+    def close(self):
+        self._file.close()
+
+    def __len__(self):
+        return len(self.results)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def server_label(mcp_config: Dict[str, Any]) -> str:
+    """Readable name of the MCP server(s) of a config, without connection settings"""
+    return " | ".join(
+        " ".join([server.get("command", ""), *server.get("args", [])]).strip() or name
+        for name, server in mcp_config.items()
+    )
+
+
+# Per-record performance columns summarized by summarize_performance,
+# list columns are flattened so that their percentiles are per step
+PERFORMANCE_METRICS = [
+    "agent_latency",
+    "llm_turn_times",
+    "tool_round_trip_times",
+    "judge_latency",
+    "llm_turns",
+    "tool_round_trips",
+    "input_tokens",
+    "output_tokens",
+    "judge_input_tokens",
+    "judge_output_tokens",
+]
+
+
+def summarize_performance(
+    records: Any,
+    by: Any = "database",
+    metrics: Optional[List[str]] = None,
+    percentiles: Tuple[float, ...] = (0.5, 0.95, 0.99)
+) -> pd.DataFrame:
+    """
+    Latency, token and tool-call percentiles of evaluation results
+
+    Args:
+        records: Evaluated records (list of dicts or DataFrame)
+        by: Column(s) to group by, e.g. "database", "server" or ["server", "database"]
+        metrics: Columns to summarize (default: PERFORMANCE_METRICS present in records)
+        percentiles: Quantiles to report (default: p50, p95 and p99)
+
+    Returns:
+        DataFrame with one row per group and a `<metric>_p<N>` column per metric and percentile
+    """
+    df = records if isinstance(records, pd.DataFrame) else pd.DataFrame(list(records))
+    metrics = [metric for metric in (metrics or PERFORMANCE_METRICS) if metric in df.columns]
+    summary = pd.DataFrame({"records": df.groupby(by).size()})
+    for metric in metrics:
+        values = df[[*([by] if isinstance(by, str) else by), metric]].explode(metric)
+        values[metric] = pd.to_numeric(values[metric], errors="coerce")
+        quantiles = values.groupby(by)[metric].quantile(list(percentiles)).unstack()
+        for q in percentiles:
+            summary[f"{metric}_p{round(q * 100)}"] = quantiles[q]
+    return summary
+
+
+# Groupings used to estimate the cost of a record, most specific first
+COST_LEVELS = [
+    ("database", "complexity", "query_type"),
+    ("complexity", "query_type"),
+    ("database", "complexity"),
+    ("complexity",),
+]
+
+
+def _hops(record: Dict[str, Any]) -> int:
+    match = re.match(r"(\d+)-hop", str(record.get("complexity", "")))
+    return int(match.group(1)) if match else 1
+
+
+class CostModel:
+    """Expected evaluation time of records, used to schedule the slowest first.
+
+    Without history the cost of a record is 1 + its number of hops. Fitted on
+    the results of previous runs, the cost is the mean agent plus judge
+    latency of the same record when it was evaluated before, otherwise of the
+    most specific group of COST_LEVELS (database, complexity, query type) with
+    at least `min_count` records, otherwise the mean of all records.
+
+    Args:
+        min_count: Records a group needs to be used for an estimate
+    """
+
+    def __init__(self, min_count: int = 3):
+        self.min_count = min_count
+        self.record_costs = {}
+        self.level_costs = {}
+        self.mean_cost = None
+
+    def fit(self, history: Any) -> "CostModel":
+        """
+        Learn costs from evaluated records
+
+        Args:
+            history: Records of previous runs (list of dicts or DataFrame), e.g.
+                result_store.to_dataframe() or load_results(...)
+        """
+        df = history if isinstance(history, pd.DataFrame) else pd.DataFrame(list(history))
+        if df.empty or "agent_latency" not in df.columns or "question" not in df.columns:
+            return self
+        cost = pd.to_numeric(df["agent_latency"], errors="coerce")
+        if "judge_latency" in df.columns:
+            cost = cost + pd.to_numeric(df["judge_latency"], errors="coerce").fillna(0.0)
+        df = df.assign(_cost=cost).dropna(subset=["_cost"])
+        if df.empty:
+            return self
+        for column in {column for level in COST_LEVELS for column in level}:
+            df[column] = df[column].fillna("Unknown").astype(str) if column in df.columns else "Unknown"
+
+        self.mean_cost = float(df["_cost"].mean())
+        rids = [record_id(record) for record in df[["question", "database"]].to_dict("records")]
+        self.record_costs = df["_cost"].groupby(rids).mean().to_dict()
+        for level in COST_LEVELS:
+            groups = df.groupby(list(level))["_cost"].agg(["mean", "count"])
+            self.level_costs[level] = {
+                key if isinstance(key, tuple) else (key,): value["mean"]
+                for key, value in groups.iterrows() if value["count"] >= self.min_count
+            }
+        return self
+
+    def estimate(self, record: Dict[str, Any]) -> float:
+        """Expected cost of a record"""
+        if self.mean_cost is None:
+            return 1.0 + _hops(record)
+        rid = record_id(record)
+        if rid in self.record_costs:
+            return self.record_costs[rid]
+        for level in COST_LEVELS:
+            key = tuple(
+                "Unknown" if _is_missing(record.get(column)) else str(record.get(column))
+                for column in level
+            )
+            if key in self.level_costs.get(level, {}):
+                return self.level_costs[level][key]
+        return self.mean_cost
+
+    def order(self, records: List[Dict[str, Any]]) -> List[int]:
+        """Positions of records, longest expected first"""
+        costs = [self.estimate(record) for record in records]
+        return sorted(range(len(records)), key=lambda position: -costs[position])
+
+
+TOOL_CALL_TYPE = pa.struct([
+    ("name", pa.string()),
+    ("args", pa.string()),  # JSON, the arguments differ per tool
+    ("id", pa.string()),
+    ("type", pa.string()),
+])
+
+# Types of the known result columns, other columns are inferred
+RESULT_SCHEMA = pa.schema([
+    ("question", pa.string()),
+    ("cypher", pa.string()),
+    ("query_type", pa.string()),
+    ("complexity", pa.string()),
+    ("noise_applied", pa.bool_()),
+    ("noise_type", pa.string()),
+    ("model", pa.string()),
+    ("database", pa.string()),
+    ("validated", pa.bool_()),
+    ("result", pa.string()),
+    ("answer", pa.string()),
+    ("tools", pa.list_(TOOL_CALL_TYPE)),
+    ("generated_answer", pa.string()),
+    ("server", pa.string()),
+    ("agent_model", pa.string()),
+    ("recursion_limit", pa.int64()),
+    ("evaluation_method", pa.string()),
+    ("evaluation_score", pa.float64()),
+    ("evaluation_reasoning", pa.string()),
+    ("evaluation_raw", pa.string()),
+    ("error", pa.string()),
+    ("tool_count", pa.int64()),
+    ("agent_latency", pa.float64()),
+    ("llm_turns", pa.int64()),
+    ("llm_turn_times", pa.list_(pa.float64())),
+    ("tool_round_trips", pa.int64()),
+    ("tool_round_trip_times", pa.list_(pa.float64())),
+    ("input_tokens_per_turn", pa.list_(pa.int64())),
+    ("output_tokens_per_turn", pa.list_(pa.int64())),
+    ("input_tokens", pa.int64()),
+    ("output_tokens", pa.int64()),
+    ("judge_latency", pa.float64()),
+    ("judge_input_tokens", pa.float64()),
+    ("judge_output_tokens", pa.float64()),
+])
+
+# Columns stored as JSON text: query results have no fixed shape
+JSON_COLUMNS = ["result"]
+
+
+def _is_missing(value: Any) -> bool:
+    # None, and NaN left by DataFrames for missing values
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _as_list(value: Any) -> Optional[list]:
+    if hasattr(value, "tolist") and not isinstance(value, (str, bytes)):
+        value = value.tolist()
+    return list(value) if isinstance(value, (list, tuple)) else None
+
+
+def _tool_call_row(call: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "name": call.get("name"),
+        "args": json.dumps(call.get("args", {}), default=_json_default),
+        "id": call.get("id"),
+        "type": call.get("type"),
+    }
+
+
+def _column_array(name: str, values: List[Any]) -> pa.Array:
+    """Arrow array of a result column, typed by RESULT_SCHEMA when possible"""
+    if name == "tools":
+        calls = [_as_list(value) for value in values]
+        values = [None if call is None else [_tool_call_row(c) for c in call] for call in calls]
+    elif name in JSON_COLUMNS:
+        values = [None if _is_missing(v) else json.dumps(v, default=_json_default) for v in values]
+    else:
+        values = [None if _is_missing(v) else v for v in values]
+
+    if name in RESULT_SCHEMA.names:
+        try:
+            return pa.array(values, type=RESULT_SCHEMA.field(name).type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed types, kept as JSON text
+        return pa.array([None if v is None else json.dumps(v, default=_json_default) for v in values], type=pa.string())
+
+
+def results_to_table(records: Any) -> pa.Table:
+    """
+    Typed Arrow table of evaluation results
+
+    Known columns get the types of RESULT_SCHEMA (tool calls as a list of
+    structs, per-step timings and tokens as lists), other columns are
+    inferred. Query results are stored as JSON text.
+
+    Args:
+        records: Evaluated records (list of dicts or DataFrame)
+    """
+    rows = records.to_dict("records") if isinstance(records, pd.DataFrame) else list(records)
+    names = []
+    for row in rows:
+        names.extend(name for name in row if name not in names)
+    # Known columns first, in schema order
+    names.sort(key=lambda name: RESULT_SCHEMA.get_field_index(name) if name in RESULT_SCHEMA.names else len(RESULT_SCHEMA))
+    arrays = [_column_array(name, [row.get(name) for row in rows]) for name in names]
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+def write_results(
+    records: Any,
+    path: str,
+    run: Optional[str] = None,
+    partition_cols: Optional[List[str]] = None,
+    compression: str = "zstd"
+) -> str:
+    """
+    Write evaluation results to compressed Parquet
+
+    Args:
+        records: Evaluated records (list of dicts or DataFrame)
+        path: Parquet file, or dataset directory when partition_cols is given
+        run: Name of the run, stored in a `run` column
+        partition_cols: Columns to partition the dataset directory by, e.g. ["run"]
+            to keep many runs in one directory. Re-writing a run replaces its partition.
+        compression: Parquet compression codec
+
+    Returns:
+        The path written
+    """
+    table = results_to_table(records)
+    if run is not None:
+        table = table.append_column("run", pa.array([run] * len(table), type=pa.string()))
+    if partition_cols:
+        pq.write_to_dataset(
+            table, path,
+            partition_cols=partition_cols,
+            compression=compression,
+            existing_data_behavior="delete_matching"
+        )
+    else:
+        pq.write_table(table, path, compression=compression)
+    return path
+
+
+def load_results(
+    path: str,
+    columns: Optional[List[str]] = None,
+    filters: Optional[Any] = None,
+    decode: bool = True
+) -> pd.DataFrame:
+    """
+    Load evaluation results written by write_results
+
+    Only the requested columns are read, and filters are pushed down to the
+    Parquet reader, which skips partitions and row groups that cannot match.
+
+    Args:
+        path: Parquet file or dataset directory
+        columns: Columns to read (default: all)
+        filters: Row filters, e.g. [("run", "=", "default"), ("evaluation_score", "<", 0.5)]
+        decode: Turn JSON columns and tool-call arguments back into Python objects and
+            list columns into lists, as produced by the evaluator
+
+    Returns:
+        DataFrame of the results
+    """
+    table = pq.read_table(path, columns=columns, filters=filters)
+    df = table.to_pandas()
+    if not decode:
+        return df
+    for name in table.column_names:
+        field_type = table.schema.field(name).type
+        if name == "tools":
+            df[name] = [
+                None if calls is None else [{**call, "args": json.loads(call["args"])} for call in calls]
+                for calls in table.column(name).to_pylist()
+            ]
+        elif name in JSON_COLUMNS and pa.types.is_string(field_type):
+            df[name] = [None if value is None else json.loads(value) for value in table.column(name).to_pylist()]
+        elif pa.types.is_list(field_type):
+            df[name] = table.column(name).to_pylist()
+    return df
+
+
+def load_results_csv(path: str) -> pd.DataFrame:
+    """Load a results CSV written with DataFrame.to_csv, parsing the stringified tools and results"""
+    df = pd.read_csv(path)
+
+    def parse(value):
+        if not isinstance(value, str):
+            return value
+        try:
+            return ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            # e.g. reprs of Neo4j temporal values
+            return value
+
+    for name in ["tools", "result"]:
+        if name in df.columns:
+            df[name] = df[name].apply(parse)
+    return df
+
+
+def custom_mcp_config(database: str, namespace: str = "graph") -> Dict[str, Any]:
+    """MCP config of the demo server for a specific database"""
+    return {
+        "neo4j-graph": {
+            "command": "uvx",
+            "args": ["mcp-neo4j-cypher@0.2.4", "--namespace", namespace],
+            "transport": "stdio",
+            "env": {
+                "NEO4J_URI": "neo4j+s://demo.neo4jlabs.com",
+                "NEO4J_USERNAME": database, 
+                "NEO4J_PASSWORD": database,
+                "NEO4J_DATABASE": database
+            }
+        }
+    }
+
+
+class MultiDatabaseMCPGraphEvaluator:
+    def __init__(
+        self, 
+        evaluation_prompt: str, 
+        namespace: str = "graph",
+        agent_model: str = "anthropic:claude-3-7-sonnet-latest",
+        evaluation_llm: Optional[Any] = None,
+        evaluation_model: str = "anthropic:claude-3-5-haiku-latest",
+        evaluation_model_kwargs: Optional[Dict[str, Any]] = None,
+        max_concurrent: int = 5,
+        recursion_limit: int = 10,
+        limiter: Optional[AdaptiveLimiter] = None,
+        max_concurrent_total: Optional[int] = None,
+        max_concurrent_per_database: Optional[Dict[str, int]] = None,
+        server_pool: Optional[MCPServerPool] = None,
+        fast_path: bool = False,
+        judge_batch_size: int = 1,
+        result_store: Optional[EvaluationStore] = None,
+        tool_trace: Optional[ToolTrace] = None,
+        backend: Optional[SnapshotMCPBackend] = None,
+        cube: Optional[ScoreCube] = None,
+        cost_model: Optional[CostModel] = None
+    ):
+        """
+        Initialize the Multi-Database MCP Graph Evaluator
+        
+        Args:
+            evaluation_prompt: The prompt template for evaluating answers
+            namespace: The namespace for the MCP server (default: "graph")
+            agent_model: The model to use for the agent
+            evaluation_llm: Pre-configured LLM instance for evaluation
+            evaluation_model: The model to use for evaluation if evaluation_llm is None
+            evaluation_model_kwargs: Additional kwargs for init_chat_model
+            max_concurrent: Maximum number of concurrent evaluations per database (default: 5)
+            recursion_limit: Maximum recursion limit for the agent (default: 10)
+            limiter: Shared adaptive limiter used as the global budget across databases
+            max_concurrent_total: Fixed global budget across databases when no limiter is given
+            max_concurrent_per_database: Per-database caps overriding max_concurrent
+            server_pool: Pool of warm MCP servers reused across evaluators and runs
+            fast_path: Score unambiguous answers deterministically instead of with the LLM judge (see fast_path_score)
+            judge_batch_size: Number of records judged per LLM request (default: 1, no batching)
+            result_store: Store of evaluated records, already stored records are skipped
+            tool_trace: Trace recording MCP tool calls, or replaying them without any server
+            backend: Local stand-in replacing the MCP servers and databases
+            cube: Aggregate cube updated with every record as soon as it is evaluated
+            cost_model: Expected cost of records, dispatched longest expected first
+        """
+        self.evaluation_prompt = evaluation_prompt
+        self.namespace = namespace
+        self.agent_model = agent_model
+        self.max_concurrent = max_concurrent
+        self.recursion_limit = recursion_limit
+        self.limiter = limiter
+        self.max_concurrent_total = max_concurrent_total
+        self.max_concurrent_per_database = max_concurrent_per_database or {}
+        self.server_pool = server_pool
+        self.fast_path = fast_path
+        self.judge_batch_size = judge_batch_size
+        self.result_store = result_store
+        self.tool_trace = tool_trace
+        self.backend = backend
+        self.cube = cube
+        self.cost_model = cost_model
+        
+        # Store evaluators for each database
+        self.evaluators = {}
+        
+        # Handle evaluation LLM
+        if evaluation_llm is not None:
+            self.llm = evaluation_llm
+        else:
+            model_kwargs = evaluation_model_kwargs or {}
+            self.llm = init_chat_model(evaluation_model, **model_kwargs)
+    
+    def get_custom_mcp_config(self, database: str) -> Dict[str, Any]:
+        """Generate MCP config for a specific database"""
+        return custom_mcp_config(database, self.namespace)
+    
+    async def get_evaluator_for_database(self, database: str):
+        """Get or create an evaluator for a specific database"""
+        if database not in self.evaluators:
+            # Create new evaluator with database-specific config
+            evaluator = MCPGraphEvaluator(
+                evaluation_prompt=self.evaluation_prompt,
+                mcp_config=self.get_custom_mcp_config(database),
+                namespace=self.namespace,
+                agent_model=self.agent_model,
+                evaluation_llm=self.llm,
+                max_concurrent=self.max_concurrent_per_database.get(database, self.max_concurrent),
+                recursion_limit=self.recursion_limit,
+                limiter=self.limiter,
+                server_pool=self.server_pool,
+                fast_path=self.fast_path,
+                judge_batch_size=self.judge_batch_size,
+                result_store=self.result_store,
+                tool_trace=self.tool_trace,
+                backend=self.backend,
+                cube=self.cube,
+                cost_model=self.cost_model
+            )
+            await evaluator.initialize()
+            self.evaluators[database] = evaluator
+        
+        return self.evaluators[database]
+    
+    async def warm_up(self, databases: List[str]):
+        """Initialize the evaluators, and their MCP servers, of several databases concurrently"""
+        await asyncio.gather(*[self.get_evaluator_for_database(database) for database in databases])
+    
+    async def evaluate_dataset(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """
+        Evaluate dataset with multiple databases
+        
+        Database groups run concurrently, each capped by its per-database limit
+        and all sharing the global budget (limiter or max_concurrent_total).
+        
+        Args:
+            df: DataFrame with columns including 'database', 'question', 'answer'
+        
+        Returns:
+            List of evaluation results in the order of df
+        """
+        # Group records by database, keeping their position in the dataset
+        grouped_records = defaultdict(list)
+        for position, (_, row) in enumerate(df.iterrows()):
+            database = row['database']
+            record = row.to_dict()
+            grouped_records[database].append((position, record))
+        
+        budget = None
+        if self.limiter is None and self.max_concurrent_total is not None:
+            budget = asyncio.Semaphore(self.max_concurrent_total)
+        
+        async def process_database(database, entries):
+            print(f"Processing {len(entries)} records for database: {database}")
+            
+            # Get evaluator for this database
+            evaluator = await self.get_evaluator_for_database(database)
+            
+            # Process records for this database
+            records = [record for _, record in entries]
+            database_results = await evaluator.evaluate_dataset(records, budget=budget)
+            return [(position, result) for (position, _), result in zip(entries, database_results)]
+        
+        # Process all database groups concurrently
+        groups = await asyncio.gather(*[
+            process_database(database, entries)
+            for database, entries in grouped_records.items()
+        ])
+        
+        # Merge results back into the original dataset order
+        all_results = [None] * len(df)
+        for group in groups:
+            for position, result in group:
+                all_results[position] = result
+        
+        return all_results
+
+
+# Your original MCPGraphEvaluator class (updated to accept recursion_limit parameter)
+class MCPGraphEvaluator:
+    def __init__(
+        self, 
+        evaluation_prompt: str, 
+        mcp_config: Optional[Dict[str, Any]] = None,
+        neo4j_config: Optional[Dict[str, str]] = None,
+        namespace: str = "graph",
+        agent_model: str = "anthropic:claude-3-7-sonnet-latest",
+        evaluation_llm: Optional[Any] = None,
+        evaluation_model: str = "anthropic:claude-3-5-haiku-latest",
+        evaluation_model_kwargs: Optional[Dict[str, Any]] = None,
+        max_concurrent: int = 5,
+        recursion_limit: int = 10,
+        limiter: Optional[AdaptiveLimiter] = None,
+        server_pool: Optional[MCPServerPool] = None,
+        fast_path: bool = False,
+        judge_batch_size: int = 1,
+        result_store: Optional[EvaluationStore] = None,
+        tool_trace: Optional[ToolTrace] = None,
+        backend: Optional[SnapshotMCPBackend] = None,
+        cube: Optional[ScoreCube] = None,
+        cost_model: Optional[CostModel] = None
+    ):
+        self.client = None
+        self.agent = None
+        self.evaluation_prompt = evaluation_prompt
+        self.namespace = namespace
+        self.agent_model = agent_model
+        self.max_concurrent = max_concurrent
+        self.recursion_limit = recursion_limit
+        self.limiter = limiter
+        self.server_pool = server_pool
+        self.fast_path = fast_path
+        self.judge_batch_size = judge_batch_size
+        self.result_store = result_store
+        self.tool_trace = tool_trace
+        self.backend = backend
+        self.cube = cube
+        self.cost_model = cost_model
+        self.startup_time = None
+        
+        # Handle MCP configuration
+        if mcp_config is not None:
+            self.mcp_config = mcp_config
+        elif neo4j_config is not None:
+            self.mcp_config = {
+                "neo4j-graph": {
+                    "command": "uvx",
+                    "args": ["mcp-neo4j-cypher@0.2.4", "--namespace", self.namespace],
+                    "transport": "stdio",
+                    "env": neo4j_config
+                }
+            }
+        else:
+            raise ValueError("Either mcp_config or neo4j_config must be provided")
+        
+        # Handle evaluation LLM
+        if evaluation_llm is not None:
+            self.llm = evaluation_llm
+        else:
+            model_kwargs = evaluation_model_kwargs or {}
+            self.llm = init_chat_model(evaluation_model, **model_kwargs)
+    
+    async def initialize(self):
+        """Initialize the MCP client and agent"""
+        started = time.perf_counter()
+        if self.backend is not None:
+            tools = self.backend.tools(self.mcp_config)
+        elif self.tool_trace is not None and self.tool_trace.mode == "replay":
+            tools = self.tool_trace.replay_tools(self.mcp_config)
+        else:
+            if self.server_pool is not None:
+                tools = await self.server_pool.get_tools(self.mcp_config)
+            else:
+                self.client = MultiServerMCPClient(self.mcp_config)
+                tools = await self.client.get_tools()
+            if self.tool_trace is not None:
+                tools = self.tool_trace.wrap_tools(tools, self.mcp_config)
+        self.agent = create_react_agent(self.agent_model, tools)
+        self.startup_time = time.perf_counter() - started
+    
+    async def extract_tool_calls_and_final_answer(
+        self,
+        input_question: str,
+        metrics: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List[Dict[str, Any]], str]:
+        """
+        Extract tool calls and final answer from agent response
+        
+        The agent is streamed step by step. When a metrics dict is given it is
+        filled with the wall time of every LLM turn and tool round-trip (one
+        per tools step, covering the tool calls of that step), the total agent
+        latency and the input/output tokens of every LLM turn.
+        """
+        tool_calls = []
+        final_answer = ""
+        messages = []
+        llm_turn_times, tool_round_trip_times = [], []
+        input_tokens, output_tokens = [], []
+        
+        started = step_started = time.perf_counter()
+        async for update in self.agent.astream({
+            "messages": [{"role": "user", "content": input_question}]
+        }, {"recursion_limit": self.recursion_limit}, stream_mode="updates"):
+            step_time = time.perf_counter() - step_started
+            for node, state in update.items():
+                new_messages = (state or {}).get("messages", [])
+                messages.extend(new_messages)
+                if node == "tools":
+                    tool_round_trip_times.append(step_time)
+                elif any(isinstance(message, AIMessage) for message in new_messages):
+                    llm_turn_times.append(step_time)
+                    for message in new_messages:
+                        usage = getattr(message, "usage_metadata", None) or {}
+                        input_tokens.append(usage.get("input_tokens", 0))
+                        output_tokens.append(usage.get("output_tokens", 0))
+            step_started = time.perf_counter()
+        
+        for message in messages:
+            if isinstance(message, AIMessage):
+                if hasattr(message, "tool_calls") and message.tool_calls:
+                    tool_calls.extend(message.tool_calls)
+                elif isinstance(message.content, str) and message.content.strip():
+                    final_answer = message.content
+        
+        if metrics is not None:
+            metrics.update({
+                "agent_latency": time.perf_counter() - started,
+                "llm_turns": len(llm_turn_times),
+                "llm_turn_times": llm_turn_times,
+                "tool_round_trips": len(tool_round_trip_times),
+                "tool_round_trip_times": tool_round_trip_times,
+                "input_tokens_per_turn": input_tokens,
+                "output_tokens_per_turn": output_tokens,
+                "input_tokens": sum(input_tokens),
+                "output_tokens": sum(output_tokens),
+            })
+        
+        return tool_calls, final_answer
+    
+    def extract_score_and_reasoning(self, text: str) -> Tuple[float, str]:
+        """Extract score and reasoning from XML tags in text"""
+        score_pattern = r'<score>(.*?)</score>'
+        reasoning_pattern = r'<reasoning>(.*?)</reasoning>'
+        
+        score_match = re.search(score_pattern, text, re.IGNORECASE | re.DOTALL)
+        reasoning_match = re.search(reasoning_pattern, text, re.IGNORECASE | re.DOTALL)
+        
+        score = None
+        if score_match:
+            try:
+                score = float(score_match.group(1).strip())
+            except ValueError:
+                pass
+        
+        reasoning = reasoning_match.group(1).strip() if reasoning_match else None
+        
+        return (score, reasoning)
+    
+    def add_judge_usage(self, record: Dict[str, Any], latency: float, response: Any, share: float = 1.0):
+        """Add the latency and tokens of a judge request (or a share of a batched one) to a record"""
+        usage = getattr(response, "usage_metadata", None) or {}
+        record['judge_latency'] = record.get('judge_latency', 0.0) + latency * share
+        record['judge_input_tokens'] = record.get('judge_input_tokens', 0) + usage.get("input_tokens", 0) * share
+        record['judge_output_tokens'] = record.get('judge_output_tokens', 0) + usage.get("output_tokens", 0) * share
+    
+    async def evaluate_answer(self, record: Dict[str, str]) -> str:
+        """Evaluate a generated answer against the reference answer"""
+        started = time.perf_counter()
+        messages = [
+            ("human", self.evaluation_prompt.format(
+                question=record["question"], 
+                reference=record["answer"], 
+                generated_answer=record["generated_answer"]
+            )),
+        ]
+        response = await self.llm.ainvoke(messages)
+        self.add_judge_usage(record, time.perf_counter() - started, response)
+        return response.content
+    
+    def batch_evaluation_message(self, records: List[Dict[str, Any]]) -> str:
+        """Build a single judge request for several records, identified by their position"""
+        instructions = self.evaluation_prompt.format(
+            question="[the question of the record]",
+            reference="[the real answer of the record]",
+            generated_answer="[the generated answer of the record]"
+        )
+        blocks = [
+            f'<record id="{i}">\n'
+            f'<question>{record["question"]}</question>\n'
+            f'<reference>{record["answer"]}</reference>\n'
+            f'<generated_answer>{record["generated_answer"]}</generated_answer>\n'
+            f'</record>'
+            for i, record in enumerate(records)
+        ]
+        return (
+            f"{instructions}\n\n"
+            f"Evaluate each of the following {len(records)} records independently, following the instructions above.\n\n"
+            + "\n".join(blocks)
+            + '\n\nFor every record, output its evaluation in the format above wrapped in <result id="ID">...</result>, '
+            "using the id of the record."
+        )
+    
+    async def evaluate_answers_batch(self, records: List[Dict[str, Any]]) -> Dict[int, str]:
+        """Evaluate several generated answers in one judge request, returning the raw output per position"""
+        started = time.perf_counter()
+        response = await self.llm.ainvoke([("human", self.batch_evaluation_message(records))])
+        # Latency and tokens of the request are split evenly between its records
+        latency = time.perf_counter() - started
+        for record in records:
+            self.add_judge_usage(record, latency, response, share=1 / len(records))
+        outputs = {}
+        for match in re.finditer(r'<result\s+id="?(\d+)"?\s*>(.*?)</result>', response.content, re.IGNORECASE | re.DOTALL):
+            outputs[int(match.group(1))] = match.group(2)
+        return outputs
+    
+    def set_evaluation(self, record: Dict[str, Any], evaluation_result: Optional[str],
+                       score: Optional[float], reasoning: Optional[str], method: str):
+        """Store the verdict of the judge in a record"""
+        record['evaluation_method'] = method
+        record['evaluation_score'] = score
+        record['evaluation_reasoning'] = reasoning
+        record['evaluation_raw'] = evaluation_result
+    
+    async def answer_record(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Generate the answer of a record, scoring it on the fast path when possible"""
+        metrics = {}
+        tools, generated_answer = await self.extract_tool_calls_and_final_answer(record["question"], metrics)
+        
+        record['tools'] = tools
+        record['generated_answer'] = generated_answer
+        record['server'] = server_label(self.mcp_config)
+        record['agent_model'] = str(self.agent_model)
+        record['recursion_limit'] = self.recursion_limit
+        record.update(metrics)
+        
+        # Deterministic verdict when possible, the LLM judge only for ambiguous cases
+        verdict = fast_path_score(record.get("result"), generated_answer, record["question"]) if self.fast_path else None
+        if verdict is not None:
+            score, reasoning = verdict
+            self.set_evaluation(record, None, score, reasoning, "fast_path")
+        
+        return record
+    
+    async def judge_record(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Evaluate the generated answer of a record with the LLM judge"""
+        evaluation_result = await self.evaluate_answer(record)
+        score, reasoning = self.extract_score_and_reasoning(evaluation_result)
+        self.set_evaluation(record, evaluation_result, score, reasoning, "llm")
+        return record
+    
+    async def judge_batch(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Evaluate records in one judge request, falling back to single requests for unparsed outputs
+
+        Rate-limit errors are raised so that the limiter backs off and retries;
+        a retry only judges the records still without a verdict.
+        """
+        pending = [record for record in records if 'evaluation_method' not in record]
+        try:
+            outputs = await self.evaluate_answers_batch(pending) if pending else {}
+        except Exception as e:
+            if is_rate_limit_error(e):
+                raise
+            print(f"Error in batched evaluation, falling back to single records: {e}")
+            outputs = {}
+        
+        fallback = []
+        for i, record in enumerate(pending):
+            output = outputs.get(i)
+            score, reasoning = self.extract_score_and_reasoning(output) if output else (None, None)
+            if score is None:
+                fallback.append(record)
+            else:
+                self.set_evaluation(record, output, score, reasoning, "llm_batch")
+        
+        for record in fallback:
+            try:
+                await self.judge_record(record)
+            except Exception as e:
+                if is_rate_limit_error(e):
+                    raise
+                print(f"Error processing record: {e}")
+                record['error'] = str(e)
+        return records
+    
+    async def evaluate_record(self, record: Dict[str, str]) -> Dict[str, Any]:
+        """Process a single record: generate answer and evaluate it"""
+        await self.answer_record(record)
+        if 'evaluation_method' not in record:
+            await self.judge_record(record)
+        return record
+    
+    async def evaluate_dataset(
+        self,
+        dataset: List[Dict[str, str]],
+        budget: Optional[asyncio.Semaphore] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Evaluate an entire dataset with concurrency control
+        
+        Args:
+            dataset: Records with 'question' and 'answer' keys
+            budget: Semaphore shared with other evaluators, ignored when a limiter is set
+        """
+        # Create semaphore to limit concurrent operations of this evaluator
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+        
+        async def run_limited(func, *args):
+            if self.limiter is not None:
+                # Adaptive limit shared with other evaluators, rate-limited calls are retried
+                return await self.limiter.run(func, *args)
+            if budget is not None:
+                async with budget:
+                    return await func(*args)
+            return await func(*args)
+        
+        def store_key(record):
+            return EvaluationStore.key(record, self.agent_model, self.mcp_config, self.recursion_limit)
+        
+        def add_to_cube(record):
+            # Keyed, so stored results returned again by a later run are counted once
+            if self.cube is not None:
+                self.cube.add(record, keys=[store_key(record)])
+        
+        def store_result(record):
+            if 'error' in record or 'evaluation_method' not in record:
+                return
+            if self.result_store is not None:
+                self.result_store.put(store_key(record), record)
+            add_to_cube(record)
+        
+        # In batched mode, answers are generated first and judged in batches afterwards
+        process = self.answer_record if self.judge_batch_size > 1 else self.evaluate_record
+        
+        async def process_record_with_semaphore(record):
+            if self.result_store is not None:
+                stored = self.result_store.get(store_key(record))
+                if stored is not None:
+                    add_to_cube(stored)
+                    return stored
+            async with semaphore:
+                try:
+                    result = await run_limited(process, record.copy())
+                    store_result(result)
+                    return result
+                except Exception as e:
+                    print(f"Error processing record: {e}")
+                    record['error'] = str(e)
+                    return record
+        
+        # Tasks acquire the semaphore in creation order, so creating them
+        # longest expected first keeps slow records from ending the run alone
+        if self.cost_model is not None:
+            order = self.cost_model.order(dataset)
+        else:
+            order = list(range(len(dataset)))
+        tasks = [process_record_with_semaphore(dataset[position]) for position in order]
+        results = [None] * len(dataset)
+        for position, result in zip(order, await asyncio.gather(*tasks)):
+            results[position] = result
+        
+        if self.judge_batch_size > 1:
+            pending = [
+                record for record in results
+                if 'error' not in record and 'evaluation_method' not in record
+            ]
+            batches = [
+                pending[i:i + self.judge_batch_size]
+                for i in range(0, len(pending), self.judge_batch_size)
+            ]
+            
+            async def judge_batch_with_semaphore(batch):
+                async with semaphore:
+                    try:
+                        await run_limited(self.judge_batch, batch)
+                    except Exception as e:
+                        # Rate limited beyond the retries of the limiter
+                        print(f"Error processing batch: {e}")
+                        for record in batch:
+                            if 'evaluation_method' not in record:
+                                record['error'] = str(e)
+                for record in batch:
+                    store_result(record)
+            
+            await asyncio.gather(*[judge_batch_with_semaphore(batch) for batch in batches])
+        
+        return results
+
+
+def stratified_order(
+    df: pd.DataFrame,
+    by: Optional[Sequence[str]] = ("database", "complexity"),
+    seed: int = 0
+) -> List[int]:
+    """
+    Random order of the rows of df in which every prefix is close to stratified
+
+    Rows are shuffled within their stratum and the i-th row of a stratum of
+    size n is placed at (i + u) / n, with u uniform in [0, 1), so that strata
+    are interleaved in proportion to their size.
+
+    Returns:
+        Row positions in evaluation order
+    """
+    rng = random.Random(seed)
+    columns = [column for column in by or [] if column in df.columns]
+    keys = list(df[columns].astype(str).itertuples(index=False, name=None)) if columns else [()] * len(df)
+    strata = defaultdict(list)
+    for position, key in enumerate(keys):
+        strata[key].append(position)
+    keyed = []
+    for key in sorted(strata):
+        positions = strata[key]
+        rng.shuffle(positions)
+        keyed.extend(((i + rng.random()) / len(positions), position) for i, position in enumerate(positions))
+    return [position for _, position in sorted(keyed)]
+
+
+async def evaluate_adaptive(
+    evaluators: List[Any],
+    df: pd.DataFrame,
+    target_width: float = 0.1,
+    batch_size: int = 20,
+    min_records: int = 30,
+    confidence: float = 0.95,
+    strata: Optional[Sequence[str]] = ("database", "complexity"),
+    seed: int = 0
+) -> Dict[str, Any]:
+    """
+    Evaluate records in stratified random order until the estimate is precise enough
+
+    With one evaluator the estimate is its mean score, with two it is the
+    mean paired difference of their scores (first minus second) on the same
+    records, which needs far fewer records than comparing two full runs.
+    Records are evaluated in batches, by both evaluators concurrently, and
+    evaluation stops once the bootstrap confidence interval of the estimate
+    is narrower than target_width.
+
+    Args:
+        evaluators: One or two evaluators (MultiDatabaseMCPGraphEvaluator)
+        df: Dataset to sample records from
+        target_width: Width of the confidence interval to stop at
+        batch_size: Records evaluated between two checks
+        min_records: Scored records (or pairs) needed before stopping
+        confidence: Confidence level of the interval
+        strata: Columns the order is stratified by
+        seed: Seed of the random order
+
+    Returns:
+        Dict with the number of evaluated records, the estimate and its
+        interval, whether it stopped early, the records of every evaluator
+        and the history of the estimate after every batch
+    """
+    if len(evaluators) not in (1, 2):
+        raise ValueError("evaluate_adaptive takes one evaluator, or two to compare")
+    order = stratified_order(df, strata, seed)
+    results = [[] for _ in evaluators]
+    history = []
+    estimate, low, high = float("nan"), float("nan"), float("nan")
+    evaluated = 0
+
+    while evaluated < len(order):
+        batch = df.iloc[order[evaluated:evaluated + batch_size]]
+        batch_results = await asyncio.gather(*[evaluator.evaluate_dataset(batch) for evaluator in evaluators])
+        for records, new in zip(results, batch_results):
+            records.extend(new)
+        evaluated += len(batch)
+
+        scores = pd.DataFrame({
+            i: pd.to_numeric(pd.Series([record.get("evaluation_score") for record in records]), errors="coerce")
+            for i, records in enumerate(results)
+        }).dropna()
+        values = scores[0] - scores[1] if len(evaluators) == 2 else scores[0]
+        estimate, low, high = bootstrap_ci(values.to_numpy(), confidence=confidence, seed=seed)
+        history.append({"evaluated": evaluated, "scored": len(values), "estimate": estimate,
+                        "ci_low": low, "ci_high": high})
+        print(f"{evaluated}/{len(order)} records: {estimate:.3f} ({low:.3f}-{high:.3f})")
+        if len(values) >= min_records and high - low <= target_width:
+            break
+
+    return {
+        "evaluated": evaluated,
+        "total": len(order),
+        "estimate": estimate,
+        "ci_low": low,
+        "ci_high": high,
+        "stopped_early": evaluated < len(order),
+        "records": results if len(evaluators) == 2 else results[0],
+        "history": pd.DataFrame(history),
+    }